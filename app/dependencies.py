@@ -1,3 +1,4 @@
+import os
 from typing import Annotated
 from fastapi import Header, HTTPException
 from .config import settings
@@ -16,6 +17,7 @@ async def get_query_token(token: str):
 # Service singletons - created once and reused
 _qdrant_service = None
 _elasticsearch_service = None
+_ingestion_jobs = None
 
 
 def get_qdrant_service():
@@ -23,7 +25,8 @@ def get_qdrant_service():
     global _qdrant_service
     if _qdrant_service is None:
         from .services.qdrant_service import QdrantService
-        _qdrant_service = QdrantService()
+        from .services.qdrant_storage import StorageOptions
+        _qdrant_service = QdrantService(storage=StorageOptions.from_env(os.environ))
     return _qdrant_service
 
 
@@ -33,4 +36,30 @@ def get_elasticsearch_service():
     if _elasticsearch_service is None:
         from .services.elasticsearch_service import ElasticsearchService
         _elasticsearch_service = ElasticsearchService()
-    return _elasticsearch_service
\ No newline at end of file
+    return _elasticsearch_service
+
+def get_ingestion_pipeline():
+    """Dependency to get an IngestionPipeline writing to Qdrant and Elasticsearch."""
+    from .services.ingestion_pipeline import IngestionPipeline
+    from .services.corpus_version import corpus_version
+    qdrant_service = get_qdrant_service()
+    return IngestionPipeline(
+        stores=[qdrant_service, get_elasticsearch_service()],
+        registry=qdrant_service.registry,
+        corpus_version=corpus_version
+    )
+
+
+def get_ingestion_jobs():
+    """Dependency to get the background IngestionJobQueue (runs uploads through get_ingestion_pipeline)."""
+    global _ingestion_jobs
+    if _ingestion_jobs is None:
+        from .services.ingestion_jobs import IngestionJobQueue
+        _ingestion_jobs = IngestionJobQueue(
+            get_ingestion_pipeline,
+            journal_path=os.getenv("INGESTION_JOURNAL", "ingestion_jobs.jsonl"),
+            spool_dir=os.getenv("INGESTION_SPOOL_DIR", "ingestion_spool"),
+            max_queued=int(os.getenv("INGESTION_MAX_QUEUED", "100")),
+            workers=int(os.getenv("INGESTION_WORKERS", "2"))
+        )
+    return _ingestion_jobs
@@ -1,3 +1,5 @@
+import hashlib
+
 def chunk_text(text, chunk_size=500, overlap=50):
     """
     Split text into chunks with overlap
@@ -27,6 +29,55 @@ def chunk_text(text, chunk_size=500, overlap=50):
         
     return chunks
 
+def iter_file_chunks(file_path, chunk_size=500, overlap=50, read_size=1024 * 1024):
+    """
+    Stream the chunks of a text file without loading the whole file
+    
+    Yields the same windows as chunk_text over the file's content, reading
+    ``read_size`` characters at a time, so memory stays flat for any file
+    size. Whitespace-only chunks are skipped.
+    
+    Args:
+        file_path (str): Path to a UTF-8 text file
+        chunk_size (int): Maximum size of each chunk
+        overlap (int): Number of characters to overlap between chunks
+        read_size (int): Characters read from the file per step
+    
+    Yields:
+        str: Text chunks
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(read_size)
+            buffer += block
+            # A window is final once more text follows it (or the file has ended)
+            start = 0
+            while len(buffer) - start > chunk_size:
+                chunk = buffer[start:start + chunk_size]
+                if chunk.strip():
+                    yield chunk
+                start += step
+            buffer = buffer[start:]
+            if not block:
+                break
+    if buffer.strip():
+        yield buffer
+
+def chunk_hash(chunk):
+    """
+    Fingerprint of a chunk's text, stored with the chunk so re-ingestion can
+    tell unchanged chunks apart from edited ones
+    
+    Args:
+        chunk (str): Chunk text
+    
+    Returns:
+        str: Hex SHA-256 of the UTF-8 text
+    """
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
 def chunk_document(document, chunk_size=500, overlap=50):
     """
     Chunk a single Document object (works with any document type)
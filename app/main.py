@@ -1,11 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
-from .dependencies import get_query_token, get_token_header
+from .dependencies import get_query_token, get_token_header, get_ingestion_jobs, get_qdrant_service
 from .routers import items, users, vectors, neural_search, documents
+import logging
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create (or backfill) the document registry off the event loop before serving requests
+    try:
+        await get_qdrant_service().registry.aensure_collection_exists()
+    except Exception as e:
+        logger.warning(f"Document registry not ready at startup, retrying on first use: {e}")
+    # Start the ingestion workers and resume jobs left unfinished by the previous run
+    ingestion_jobs = get_ingestion_jobs()
+    await ingestion_jobs.start()
+    yield
+    await ingestion_jobs.stop()
+
 
 app = FastAPI(
     title="RAG Chatbot API",
     description="A FastAPI backend for RAG (Retrieval-Augmented Generation) system with Qdrant vector database",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
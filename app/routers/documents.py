@@ -1,18 +1,27 @@
 from asyncio.log import logger
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from pydantic import BaseModel
-from typing import Union, List
+from typing import Union, List, Literal, Optional
+import asyncio
+import hashlib
+import time
 import uuid
 import os
+import numpy as np
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 
 # Import pipeline components
-from app.document_loader.loader import load_text_file
-from app.document_loader.chunker import chunk_text, chunk_document
-from app.dependencies import get_token_header, get_qdrant_service, get_elasticsearch_service
+from app.document_loader.chunker import iter_file_chunks
+from app.dependencies import get_token_header, get_qdrant_service, get_elasticsearch_service, get_ingestion_pipeline, get_ingestion_jobs
 from app.services.query_processor import process_query
+from app.services.query_context import QueryContext
+from app.services.fusion import fuse
 from app.services.semantic_cache_service import semantic_cache  # Import semantic cache
+from app.services.corpus_version import corpus_version
+from app.services.ingestion_pipeline import document_id_for
+from app.services.embedding_cache import embedding_cache
+from app.services.cache_service import cache
 
 router = APIRouter(
     prefix="/documents",
@@ -21,20 +30,55 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+class SearchFilters(BaseModel):
+    document_ids: Optional[List[str]] = None  # Only chunks of these documents
+    titles: Optional[List[str]] = None  # Only chunks of files with these names
+    uploaded_after: Optional[datetime] = None  # Inclusive bounds on the upload time
+    uploaded_before: Optional[datetime] = None
+
+def _filters_dict(filters: Optional[SearchFilters]) -> Optional[dict]:
+    """Filters as the plain dict the search services take (None when nothing is set)."""
+    if filters is None:
+        return None
+    return filters.model_dump(exclude_none=True) or None
+
 class SearchRequest(BaseModel):
     query: str
     limit: int = 5
+    filters: Optional[SearchFilters] = None
 
 class DocumentResponse(BaseModel):
     document_id: str
     message: str
     chunks_created: int
+    chunks_embedded: int = 0  # New or edited chunks (the rest were already stored unchanged)
+    chunks_removed: int = 0  # Chunks of the previous revision past the new end
 
 class HybridSearchRequest(BaseModel):
     query: str
     limit: int = 5
     qdrant_weight: float = 0.5  # Weight for Qdrant results (0-1)
     elasticsearch_weight: float = 0.5  # Weight for Elasticsearch results (0-1)
+    leg_timeout: float = 5.0  # Seconds each backend gets before it is reported as degraded
+    fusion: Literal["rrf", "minmax", "zscore"] = "rrf"  # How the two ranked lists are combined
+    rrf_k: int = 60  # Rank offset for Reciprocal Rank Fusion
+    filters: Optional[SearchFilters] = None  # Restrict both legs to some documents / upload times
+
+async def _run_search_leg(name: str, search_coro, timeout: float):
+    """Await one retrieval leg with a timeout.
+    
+    Returns (results, error, elapsed_ms); a slow or failing leg yields no results and an error message.
+    """
+    start = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(search_coro, timeout=timeout)
+        return results or [], None, round((time.perf_counter() - start) * 1000, 1)
+    except asyncio.TimeoutError:
+        error = f"timed out after {timeout}s"
+    except Exception as e:
+        error = str(e)
+    logger.warning(f"Hybrid search leg '{name}' degraded: {error}")
+    return [], error, round((time.perf_counter() - start) * 1000, 1)
 
 @router.get("/")
 def list_files(qdrant_service = Depends(get_qdrant_service)):
@@ -51,65 +95,69 @@ def check_file(filename: str, qdrant_service = Depends(get_qdrant_service)):
     exists = qdrant_service.file_exists(filename)
     return {"filename": filename, "exists": exists}
 
-@router.post("/upload-file")
-async def upload_text_file(
-    file: UploadFile = File(...),
-    qdrant_service = Depends(get_qdrant_service),
-    elasticsearch_service = Depends(get_elasticsearch_service)
-):
-    """Upload text files (.txt, .md) following the indexing pipeline: read → clean/chunk → embed → store"""
+@router.get("/cache/stats")
+def cache_stats():
+    """Hit and miss counters of the embedding cache and of each search cache tier, with semantic cache size and evictions"""
+    return {
+        "embeddings": embedding_cache.stats(),
+        "search": semantic_cache.stats(),
+        "redis": cache.breaker.stats()
+    }
+
+ALLOWED_EXTENSIONS = ['.txt', '.md']
+
+def _check_extension(filename: str):
+    if not any(filename.endswith(ext) for ext in ALLOWED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"Only {', '.join(ALLOWED_EXTENSIONS)} files supported")
+
+async def _spool_upload(file: UploadFile, path: str) -> str:
+    """Write an upload to disk in blocks (never the whole file in memory); returns its SHA-256.
+
+    Raises 400 (and removes the file) when the upload is empty."""
+    file_hash = hashlib.sha256()
+    # File I/O runs in a thread so the event loop keeps serving other requests
+    f = await asyncio.to_thread(open, path, "wb")
     try:
-        # Validate file type - only text files now
-        allowed_extensions = ['.txt', '.md']
-        if not any(file.filename.endswith(ext) for ext in allowed_extensions):
-            raise HTTPException(status_code=400, detail=f"Only {', '.join(allowed_extensions)} files supported")
-        
-        doc_id = str(uuid.uuid4())
-        temp_file_path = f"temp_{doc_id}{os.path.splitext(file.filename)[1]}"
-        
-        # Step 1: Save and load document
-        content = await file.read()
-        with open(temp_file_path, "wb") as f:
-            f.write(content)
-        
-        # Load as Document object with metadata
-        document = load_text_file(temp_file_path)
-        if not document:
-            raise HTTPException(status_code=400, detail="Failed to load file")
-        
-        # Step 2: Clean and chunk the document
-        import time
-        chunk_start = time.time()
-        chunked_docs = chunk_document(document, chunk_size=500, overlap=50)
-        chunks = [chunk_doc['content'] for chunk_doc in chunked_docs]
-        logger.info(f"Created {len(chunks)} chunks from {file.filename} in {time.time() - chunk_start:.2f}s")
+        while block := await file.read(1024 * 1024):
+            file_hash.update(block)
+            await asyncio.to_thread(f.write, block)
+        size = f.tell()
+    finally:
+        await asyncio.to_thread(f.close)
+    if size == 0:
+        await asyncio.to_thread(os.remove, path)
+        raise HTTPException(status_code=400, detail="File is empty")
+    return file_hash.hexdigest()
+
+async def _ingest_upload(file: UploadFile, pipeline, doc_id: str, title: str) -> DocumentResponse:
+    """Spool an upload to disk and run it through the ingestion pipeline as document ``doc_id``."""
+    try:
+        temp_file_path = f"temp_{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"
         
-        # Step 3: Store in both Qdrant and Elasticsearch (both generate embeddings internally)
-        # Store in Qdrant
-        qdrant_start = time.time()
-        chunks_stored = qdrant_service.store_document_chunks(
-            document_id=doc_id,
-            chunks=chunks,
-            title=file.filename
-        )
-        logger.info(f"Stored in Qdrant in {time.time() - qdrant_start:.2f}s")
+        # Step 1: Spool the upload to disk, hashing it on the way
+        content_hash = await _spool_upload(file, temp_file_path)
         
-        # Store in Elasticsearch
-        es_start = time.time()
-        elasticsearch_service.store_document_chunks(
+        # Steps 2-3: Stream chunks from the file; each batch is embedded once and stored in
+        # Qdrant and Elasticsearch by parallel workers, so memory stays flat for large files.
+        # Unchanged files and chunks are skipped, chunks that disappeared are removed
+        store_start = time.time()
+        summary = await pipeline.arun(
             document_id=doc_id,
-            chunks=chunks,
-            title=file.filename
+            chunks=iter_file_chunks(temp_file_path, chunk_size=500, overlap=50),
+            title=title,
+            content_hash=content_hash
         )
-        logger.info(f"Stored in Elasticsearch in {time.time() - es_start:.2f}s")
+        logger.info(f"Stored {title} in Qdrant and Elasticsearch in {time.time() - store_start:.2f}s: {summary}")
         
         # Cleanup
         os.remove(temp_file_path)
         
         return DocumentResponse(
             document_id=doc_id,
-            message=f"Text file processed successfully: {file.filename}",
-            chunks_created=chunks_stored
+            message=f"Text file processed successfully: {title}",
+            chunks_created=summary["chunks"],
+            chunks_embedded=summary["embedded"],
+            chunks_removed=summary["removed"]
         )
         
     except Exception as e:
@@ -118,8 +166,126 @@ async def upload_text_file(
                 os.remove(temp_file_path)
         except:
             pass
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@router.post("/upload-file", status_code=202)
+async def upload_text_file(
+    file: UploadFile = File(...),
+    jobs = Depends(get_ingestion_jobs),
+    qdrant_service = Depends(get_qdrant_service)
+):
+    """Upload text files (.txt, .md) for background indexing: read → clean/chunk → embed → store.
+
+    Returns a job id as soon as the file is spooled; poll ``GET /documents/jobs/{job_id}``.
+    Responds 503 with Retry-After while the ingestion queue is full.
+    Documents are identified by file name: uploading a file whose name is already stored
+    replaces that document (``replaces_existing`` in the response)."""
+    _check_extension(file.filename)
+    # Reject before reading the body when the queue is already full
+    if jobs.full:
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, retry later",
+                            headers={"Retry-After": "10"})
+    
+    job_id = str(uuid.uuid4())
+    # Same file name -> same document id, so a re-upload updates the document in place
+    doc_id = document_id_for(file.filename)
+    try:
+        replaces_existing = await qdrant_service.registry.aget(doc_id) is not None
+    except Exception as e:
+        logger.warning(f"Could not check the registry for {file.filename}: {e}")
+        replaces_existing = None
+    spool_path = jobs.spool_path(job_id, os.path.splitext(file.filename)[1])
+    try:
+        spool_start = time.perf_counter()
+        content_hash = await _spool_upload(file, spool_path)
+        job = await jobs.submit(
+            job_id=job_id,
+            document_id=doc_id,
+            title=file.filename,
+            path=spool_path,
+            content_hash=content_hash,
+            spool_ms=round((time.perf_counter() - spool_start) * 1000, 1)
+        )
+    except HTTPException:
+        raise
+    except asyncio.QueueFull:
+        await asyncio.to_thread(os.remove, spool_path)
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, retry later",
+                            headers={"Retry-After": "10"})
+    except Exception as e:
+        try:
+            await asyncio.to_thread(os.remove, spool_path)
+        except OSError:
+            pass
+        raise HTTPException(status_code=500, detail=f"Error queueing file: {str(e)}")
+    
+    return {
+        "job_id": job_id,
+        "document_id": doc_id,
+        "status": job["status"],
+        "replaces_existing": replaces_existing,
+        "message": (f"Text file queued for processing: {file.filename}"
+                    + (" (replaces the stored document with the same file name)" if replaces_existing else ""))
+    }
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: str, jobs = Depends(get_ingestion_jobs)):
+    """Status of a background ingestion job: stage timings (ms) and chunk counts."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+async def _registered_document(pipeline, document_id: str) -> dict:
+    """Registry record of a document, or 404."""
+    try:
+        record = await pipeline.registry.aget(document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading document registry: {str(e)}")
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
+    return record
+
+@router.put("/{document_id}")
+async def replace_document(
+    document_id: str,
+    file: UploadFile = File(...),
+    pipeline = Depends(get_ingestion_pipeline),
+    jobs = Depends(get_ingestion_jobs)
+):
+    """Replace the content of a document with an uploaded file (it keeps its id and file name).
+
+    Only chunks whose text changed are re-embedded; chunks past the new end are deleted.
+    Waits for any background ingestion of the same document to finish first."""
+    _check_extension(file.filename)
+    record = await _registered_document(pipeline, document_id)
+    async with jobs.document_lock(document_id):
+        return await _ingest_upload(file, pipeline, document_id, record["filename"])
+
+@router.delete("/{document_id}")
+async def delete_document(
+    document_id: str,
+    pipeline = Depends(get_ingestion_pipeline),
+    jobs = Depends(get_ingestion_jobs)
+):
+    """Delete a document from Qdrant and Elasticsearch (concurrently) and from the registry.
+
+    Cached search results are invalidated through the corpus generation."""
+    record = await _registered_document(pipeline, document_id)
+    try:
+        async with jobs.document_lock(document_id):
+            await pipeline.adelete(document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+    return {
+        "document_id": document_id,
+        "filename": record["filename"],
+        "chunks_deleted": record["total_chunks"],
+        "message": f"Document deleted: {record['filename']}"
+    }
+
 @router.post("/search-qdrant")
 async def search_documents(search: SearchRequest, qdrant_service = Depends(get_qdrant_service)):
     """Search uploaded documents using Qdrant only"""
@@ -127,8 +293,14 @@ async def search_documents(search: SearchRequest, qdrant_service = Depends(get_q
         # Process query before searching
         cleaned_query, intent = process_query(search.query)
         
-        # Search with cleaned query
-        results = qdrant_service.search(text=cleaned_query, limit=search.limit)
+        # Embed without blocking the event loop, then search with cleaned query
+        query_vector = await QueryContext(cleaned_query).aget_vector()
+        results = await qdrant_service.asearch(
+            text=cleaned_query,
+            limit=search.limit,
+            vector=query_vector,
+            filters=_filters_dict(search.filters)
+        )
         
         return {
             "query": search.query,
@@ -150,8 +322,14 @@ async def search_elasticsearch(search: SearchRequest, elasticsearch_service = De
         # Process query before searching
         cleaned_query, intent = process_query(search.query)
         
-        # Search Elasticsearch (generates embeddings internally)
-        results = elasticsearch_service.search(text=cleaned_query, top_k=search.limit)
+        # Embed without blocking the event loop, then search Elasticsearch
+        query_vector = await QueryContext(cleaned_query).aget_vector()
+        results = await elasticsearch_service.asearch(
+            text=cleaned_query,
+            top_k=search.limit,
+            vector=query_vector,
+            filters=_filters_dict(search.filters)
+        )
         
         return {
             "query": search.query,
@@ -172,104 +350,140 @@ async def search_hybrid(
     qdrant_service = Depends(get_qdrant_service),
     elasticsearch_service = Depends(get_elasticsearch_service)
 ):
-    """Hybrid search combining results from both Qdrant and Elasticsearch using weighted scoring"""
+    """Hybrid search combining dense Qdrant results and BM25 Elasticsearch results (RRF, min-max or z-score fusion)"""
     try:
-        # Step 1: Check semantic cache first (uses embeddings to find similar queries)
+        # Step 1: Process query. The corpus generation is read before searching
+        # so results of a concurrent upload aren't cached as fresh.
+        generation = await corpus_version.acurrent()
         normalized_query = search.query.strip()
+        cleaned_query, intent = process_query(normalized_query)
+        filters = _filters_dict(search.filters)
+        filters_json = search.filters.model_dump(mode="json", exclude_none=True) if filters else None
+        
+        # Step 2a: Exact cache tier - same queries and parameters, no embedding needed. The key holds
+        # the exact string each leg searches (cleaned for dense, as typed for BM25). A query that
+        # cleans to nothing (only stopwords, or a script the cleaner strips) isn't cached at all:
+        # its dense leg would be the same for every such query.
+        cacheable = bool(cleaned_query)
+        cache_params = {
+            "limit": search.limit,
+            "fusion": search.fusion,
+            "rrf_k": search.rrf_k,
+            "weights": [search.qdrant_weight, search.elasticsearch_weight],
+            "filters": filters_json
+        }
+        exact_key = None
+        if cacheable:
+            exact_key = semantic_cache.exact_key({"qdrant": cleaned_query, "elasticsearch": normalized_query},
+                                                 cache_params, generation)
+            cached_results = await semantic_cache.aget_exact(exact_key)
+            if cached_results:
+                cached_results['cached'] = True
+                cached_results['cache_tier'] = 'exact'
+                return cached_results
         
-        cached_results = semantic_cache.get(normalized_query)
+        # Step 2b: Semantic cache tier - embed the query once for the cache and the dense (Qdrant) leg.
+        # A similar query only hits with the same parameters; filtered searches only use the exact tier.
+        query_context = QueryContext(cleaned_query)
+        query_vector = await query_context.aget_vector()
+        cached_results = None
+        if cacheable and not filters:
+            cached_results = await semantic_cache.aget(normalized_query, query_embedding=query_vector,
+                                                       generation=generation, params=cache_params)
         
         if cached_results:
             cached_results['cached'] = True
+            cached_results['cache_tier'] = 'semantic'
             return cached_results
         
-        # Step 2: Cache miss - process query and do actual search
-        cleaned_query, intent = process_query(normalized_query)
-        
-        # Search both systems (both generate embeddings internally)
-        qdrant_results = qdrant_service.search(text=cleaned_query, limit=search.limit * 2)
-        es_results = elasticsearch_service.search(text=cleaned_query, top_k=search.limit * 2)
-        
-        # Handle None results
-        if qdrant_results is None:
-            qdrant_results = []
-        if es_results is None:
-            es_results = []
+        # Step 3: Cache miss - dense Qdrant search (shared query vector) and BM25 Elasticsearch search, concurrently
+        (qdrant_results, qdrant_error, qdrant_ms), (es_results, es_error, es_ms) = await asyncio.gather(
+            _run_search_leg(
+                "qdrant",
+                qdrant_service.asearch(text=cleaned_query, limit=search.limit * 2, vector=query_vector, filters=filters),
+                search.leg_timeout
+            ),
+            _run_search_leg(
+                "elasticsearch",
+                elasticsearch_service.asearch_lexical(text=normalized_query, top_k=search.limit * 2, filters=filters),
+                search.leg_timeout
+            )
+        )
         
-        # Combine and rank results using weighted scoring
-        combined_results = {}
+        degraded = {name: error for name, error in (("qdrant", qdrant_error), ("elasticsearch", es_error)) if error}
+        if len(degraded) == 2:
+            raise HTTPException(status_code=503, detail=f"Both search backends failed: {degraded}")
         
-        # Add Qdrant results with weight
-        for i, result in enumerate(qdrant_results):
-            doc_id = result.get('document_id', '')
-            chunk_idx = result.get('chunk_index', 0)
-            key = f"{doc_id}_{chunk_idx}"
-            
-            # Normalize score (higher rank = higher score)
-            normalized_score = (len(qdrant_results) - i) / len(qdrant_results)
-            
-            combined_results[key] = {
+        # Combine and rank results on the backends' real scores with the requested fusion strategy
+        candidates = {}
+        for result in qdrant_results:
+            candidates.setdefault((result.get('document_id', ''), result.get('chunk_index', 0)), {
                 'content': result.get('content', ''),
-                'document_id': doc_id,
-                'chunk_index': chunk_idx,
-                'title': result.get('title', ''),
-                'qdrant_score': normalized_score,
-                'es_score': 0.0,
-                'combined_score': normalized_score * search.qdrant_weight
-            }
+                'title': result.get('title', '')
+            })
+        for result in es_results:
+            candidates.setdefault((result['metadata'].get('document_id', ''), result['metadata'].get('chunk_index', 0)), {
+                'content': result.get('content', ''),
+                'title': result['metadata'].get('title', '')
+            })
         
-        # Add Elasticsearch results with weight
-        for i, result in enumerate(es_results):
-            doc_id = result['metadata'].get('document_id', '')
-            chunk_idx = result['metadata'].get('chunk_index', 0)
-            key = f"{doc_id}_{chunk_idx}"
-            
-            # Normalize score
-            normalized_score = (len(es_results) - i) / len(es_results)
-            
-            if key in combined_results:
-                # Update existing entry
-                combined_results[key]['es_score'] = normalized_score
-                combined_results[key]['combined_score'] += normalized_score * search.elasticsearch_weight
-            else:
-                # Add new entry
-                combined_results[key] = {
-                    'content': result.get('content', ''),
-                    'document_id': doc_id,
-                    'chunk_index': chunk_idx,
-                    'title': result['metadata'].get('title', ''),
-                    'qdrant_score': 0.0,
-                    'es_score': normalized_score,
-                    'combined_score': normalized_score * search.elasticsearch_weight
-                }
+        keys, fused_scores, leg_scores = fuse(
+            [
+                [((r.get('document_id', ''), r.get('chunk_index', 0)), r.get('score', 0.0)) for r in qdrant_results],
+                [((r['metadata'].get('document_id', ''), r['metadata'].get('chunk_index', 0)), r['score']) for r in es_results]
+            ],
+            weights=[search.qdrant_weight, search.elasticsearch_weight],
+            strategy=search.fusion,
+            rrf_k=search.rrf_k
+        )
         
-        # Sort by combined score and return top K
-        sorted_results = sorted(
-            combined_results.values(),
-            key=lambda x: x['combined_score'],
-            reverse=True
-        )[:search.limit]
+        # Keep top K; per-backend scores are the raw similarity / BM25 scores (0.0 when not retrieved)
+        sorted_results = [
+            {
+                **candidates[key],
+                'document_id': key[0],
+                'chunk_index': key[1],
+                'qdrant_score': 0.0 if np.isnan(leg_scores[0, i]) else float(leg_scores[0, i]),
+                'es_score': 0.0 if np.isnan(leg_scores[1, i]) else float(leg_scores[1, i]),
+                'combined_score': float(fused_scores[i])
+            }
+            for i, key in enumerate(keys[:search.limit])
+        ]
         
-        # Step 3: Build response
+        # Step 4: Build response
         response = {
             "query": search.query,
             "cleaned_query": cleaned_query,
             "intent": intent,
             "limit": search.limit,
             "source": "hybrid",
+            "fusion": search.fusion,
+            "filters": filters_json,
             "weights": {
                 "qdrant": search.qdrant_weight,
                 "elasticsearch": search.elasticsearch_weight
             },
             "results": sorted_results,
             "total_found": len(sorted_results),
-            "cached": False
+            "cached": False,
+            "degraded": degraded,
+            "timings_ms": {
+                "qdrant": qdrant_ms,
+                "elasticsearch": es_ms
+            }
         }
         
-        # Step 4: Save to semantic cache (10 minutes TTL)
-        semantic_cache.set(normalized_query, response, ttl=600)
+        # Step 5: Save to both cache tiers (10 minutes TTL); partial results are not cached
+        if cacheable and not degraded:
+            if filters:
+                await semantic_cache.aset_exact(exact_key, response, ttl=600)
+            else:
+                await semantic_cache.aset(normalized_query, response, ttl=600, query_embedding=query_vector,
+                                         generation=generation, exact_key=exact_key, params=cache_params)
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Hybrid search error: {str(e)}")
@@ -1,26 +1,183 @@
 import redis
-import json
-from typing import Optional, Dict, Any
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from redis.retry import Retry
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List
+from app.services.serialization import encode, encode_vector, decode
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Stops calling Redis after repeated failures.
+    
+    After ``failure_threshold`` consecutive failures the circuit opens: callers
+    skip the cache instead of each waiting for a socket timeout. Once the
+    backoff has passed calls are let through again as probes; a failed probe
+    doubles the backoff (up to ``max_reset_timeout``), a successful one closes
+    the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 1.0, max_reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failures = 0
+        self.opened_count = 0
+        self._backoff = reset_timeout
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+    
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.failure_threshold
+    
+    def allow(self) -> bool:
+        """True when a call may go to Redis (circuit closed, or its backoff has passed)."""
+        return not self.is_open or time.monotonic() >= self._next_attempt
+    
+    def record_success(self):
+        if self.failures:
+            with self._lock:
+                if self.is_open:
+                    logger.info("Redis reachable again, cache circuit closed")
+                self.failures = 0
+                self._backoff = self.reset_timeout
+    
+    def record_failure(self, error: Exception = None):
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+            now = time.monotonic()
+            if self.failures == self.failure_threshold:
+                self.opened_count += 1
+            elif now < self._next_attempt:
+                # Call started before the circuit opened; the backoff already applies
+                return
+            else:
+                # Failed probe: wait longer before the next one
+                self._backoff = min(self._backoff * 2, self.max_reset_timeout)
+            self._next_attempt = now + self._backoff
+            logger.warning(f"Redis unavailable ({error}), cache circuit open for {self._backoff:.1f}s")
+    
+    def trip(self, error: Exception = None):
+        """Open the circuit immediately (e.g. the startup ping failed)."""
+        while not self.is_open:
+            self.record_failure(error)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"open": self.is_open, "consecutive_failures": self.failures, "times_opened": self.opened_count}
 
 
 class CacheService:
-    """Simple Redis cache service for search results."""
-    
-    def __init__(self):
-        """Initialize Redis connection."""
-        try:
-            self.redis = redis.Redis(
-                host='localhost',
-                port=6379,
-                decode_responses=True,
-                # after 2 seconds raise an error if cannot connect
-                socket_connect_timeout=2
-            )
-            # Test connection
+    """
+    Simple Redis cache service for search results.
+    
+    Values are stored in a compact binary form (see ``serialization``):
+    orjson/msgpack for payloads when installed, raw float32 for vectors
+    (``set_vectors``), optionally zstd-compressed. Reads also accept values
+    written as plain JSON.
+    
+    Sync and asyncio clients share configured connection pools with health
+    checks and retry with exponential backoff, so the cache recovers by itself
+    after a Redis restart. A circuit breaker makes the cache look disabled
+    while Redis is down or timing out.
+    """
+    
+    def __init__(self, url: str = "redis://localhost:6379/0", max_connections: int = 50,
+                 socket_timeout: float = 1.0, socket_connect_timeout: float = 2.0,
+                 health_check_interval: int = 30, retries: int = 2, batch_size: int = 500,
+                 compress: bool = False, payload_format: Optional[str] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize Redis connection pools (connections are opened on demand).
+        
+        Args:
+            url: Redis URL, e.g. redis://:password@host:6379/0
+            max_connections: Size of each connection pool
+            socket_timeout: Seconds to wait for a reply before failing the command
+            socket_connect_timeout: Seconds to wait when (re)connecting
+            health_check_interval: Idle seconds after which a pooled connection is PINGed before reuse
+            retries: Retries (with exponential backoff) on connection errors and timeouts
+            batch_size: Keys per MGET/SETEX batch in get_many/set_many
+            compress: zstd-compress stored values (needs the zstandard package)
+            payload_format: "orjson", "msgpack" or "json" (defaults to the fastest installed)
+            breaker: Circuit breaker (defaults to 3 failures, 1s backoff doubling up to 30s)
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.compress = compress
+        self.payload_format = payload_format
+        self.breaker = breaker or CircuitBreaker()
+        
+        options = dict(
+            max_connections=max_connections,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
+        )
+        retry_on = [RedisConnectionError, RedisTimeoutError]
+        self.redis = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(url, decode_responses=True, **options),
+            retry=Retry(ExponentialBackoff(cap=0.5, base=0.05), retries),
+            retry_on_error=retry_on
+        )
+        # Clients without response decoding for binary values (encoded payloads, float32 vectors)
+        self.raw_redis = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(url, **options),
+            retry=Retry(ExponentialBackoff(cap=0.5, base=0.05), retries),
+            retry_on_error=retry_on
+        )
+        # Async clients for the async FastAPI handlers
+        self.async_redis = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(url, decode_responses=True, **options),
+            retry=AsyncRetry(ExponentialBackoff(cap=0.5, base=0.05), retries),
+            retry_on_error=retry_on
+        )
+        self.async_raw_redis = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(url, **options),
+            retry=AsyncRetry(ExponentialBackoff(cap=0.5, base=0.05), retries),
+            retry_on_error=retry_on
+        )
+        self.ping()
+    
+    @property
+    def enabled(self) -> bool:
+        """False while the circuit breaker is open (Redis down or too slow)."""
+        return self.breaker.allow()
+    
+    def record_success(self):
+        """Report a successful Redis call made directly on one of the clients."""
+        self.breaker.record_success()
+    
+    def record_failure(self, error: Exception = None):
+        """Report a failed Redis call made directly on one of the clients."""
+        self.breaker.record_failure(error)
+    
+    def ping(self) -> bool:
+        """Check the connection; opens the circuit when Redis is unreachable."""
+        try:
             self.redis.ping()
-            self.enabled = True
+            self.breaker.record_success()
+            return True
         except Exception as e:
-            self.enabled = False
+            self.breaker.trip(e)
+            return False
+    
+    def _encode(self, value: Any) -> bytes:
+        return encode(value, self.payload_format, self.compress)
+    
+    def _batches(self, items: list):
+        for start in range(0, len(items), self.batch_size):
+            yield items[start:start + self.batch_size]
     
     def get(self, key: str) -> Optional[Dict[Any, Any]]:
         """
@@ -31,11 +188,12 @@ class CacheService:
             return None
         
         try:
-            value = self.redis.get(key)
+            value = self.raw_redis.get(key)
+            self.breaker.record_success()
             if value:
-                return json.loads(value)
+                return decode(value)
         except Exception as e:
-            pass
+            self.breaker.record_failure(e)
         
         return None
     
@@ -45,17 +203,159 @@ class CacheService:
         
         Args:
             key: Cache key
-            value: Data to cache (must be JSON serializable)
+            value: Data to cache (must be JSON compatible)
             ttl: Expiration time in seconds (default 10 minutes)
         """
         if not self.enabled:
             return
         
         try:
-            self.redis.setex(key, ttl, json.dumps(value))
+            self.raw_redis.setex(key, ttl, self._encode(value))
+            self.breaker.record_success()
+        except Exception as e:
+            self.breaker.record_failure(e)
+    
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Get several values in one round-trip (one MGET per ``batch_size`` keys, pipelined).
+        Returns one entry per key, None for missing keys or when cache is disabled.
+        """
+        if not self.enabled or not keys:
+            return [None] * len(keys)
+        
+        try:
+            pipe = self.raw_redis.pipeline(transaction=False)
+            for batch in self._batches(keys):
+                pipe.mget(batch)
+            values = [value for batch in pipe.execute() for value in batch]
+            self.breaker.record_success()
+            return [decode(value) if value else None for value in values]
+        except Exception as e:
+            self.breaker.record_failure(e)
+            return [None] * len(keys)
+    
+    def _queue_writes(self, pipe, mapping: Dict[str, bytes], ttl: Optional[int]):
+        """MSET per batch, or SETEX per key when a TTL is given (MSET has no TTL)."""
+        if ttl is None:
+            for batch in self._batches(list(mapping.items())):
+                pipe.mset(dict(batch))
+        else:
+            for key, value in mapping.items():
+                pipe.setex(key, ttl, value)
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = 600):
+        """
+        Save several values in one pipelined round-trip.
+        
+        Args:
+            mapping: Cache key -> data (must be JSON compatible)
+            ttl: Expiration time in seconds (default 10 minutes, None = no expiry via MSET)
+        """
+        if not self.enabled or not mapping:
+            return
+        
+        try:
+            pipe = self.raw_redis.pipeline(transaction=False)
+            self._queue_writes(pipe, {key: self._encode(value) for key, value in mapping.items()}, ttl)
+            pipe.execute()
+            self.breaker.record_success()
+        except Exception as e:
+            self.breaker.record_failure(e)
+    
+
+    async def aget(self, key: str) -> Optional[Dict[Any, Any]]:
+        """Async variant of get using redis.asyncio."""
+        if not self.enabled:
+            return None
+        
+        try:
+            value = await self.async_raw_redis.get(key)
+            self.breaker.record_success()
+            if value:
+                return decode(value)
+        except Exception as e:
+            self.breaker.record_failure(e)
+        
+        return None
+    
+    async def aset(self, key: str, value: Dict[Any, Any], ttl: int = 600):
+        """Async variant of set using redis.asyncio."""
+        if not self.enabled:
+            return
+        
+        try:
+            await self.async_raw_redis.setex(key, ttl, self._encode(value))
+            self.breaker.record_success()
+        except Exception as e:
+            self.breaker.record_failure(e)
+    
+    async def aget_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Async variant of get_many using redis.asyncio."""
+        if not self.enabled or not keys:
+            return [None] * len(keys)
+        
+        try:
+            pipe = self.async_raw_redis.pipeline(transaction=False)
+            for batch in self._batches(keys):
+                pipe.mget(batch)
+            values = [value for batch in await pipe.execute() for value in batch]
+            self.breaker.record_success()
+            return [decode(value) if value else None for value in values]
+        except Exception as e:
+            self.breaker.record_failure(e)
+            return [None] * len(keys)
+    
+    async def aset_many(self, mapping: Dict[str, Any], ttl: Optional[int] = 600):
+        """Async variant of set_many using redis.asyncio."""
+        if not self.enabled or not mapping:
+            return
+        
+        try:
+            pipe = self.async_raw_redis.pipeline(transaction=False)
+            self._queue_writes(pipe, {key: self._encode(value) for key, value in mapping.items()}, ttl)
+            await pipe.execute()
+            self.breaker.record_success()
+        except Exception as e:
+            self.breaker.record_failure(e)
+    
+
+    def set_vectors(self, mapping: Dict[str, List[float]], ttl: Optional[int] = 600):
+        """
+        Save several vectors as raw float32 in one pipelined round-trip.
+        Read them back with get_many/aget_many (returned as lists of floats).
+        """
+        if not self.enabled or not mapping:
+            return
+        
+        try:
+            pipe = self.raw_redis.pipeline(transaction=False)
+            self._queue_writes(pipe, {key: encode_vector(vector, self.compress) for key, vector in mapping.items()}, ttl)
+            pipe.execute()
+            self.breaker.record_success()
+        except Exception as e:
+            self.breaker.record_failure(e)
+    
+    async def aset_vectors(self, mapping: Dict[str, List[float]], ttl: Optional[int] = 600):
+        """Async variant of set_vectors using redis.asyncio."""
+        if not self.enabled or not mapping:
+            return
+        
+        try:
+            pipe = self.async_raw_redis.pipeline(transaction=False)
+            self._queue_writes(pipe, {key: encode_vector(vector, self.compress) for key, vector in mapping.items()}, ttl)
+            await pipe.execute()
+            self.breaker.record_success()
         except Exception as e:
-            pass
+            self.breaker.record_failure(e)
 
 
-# Global cache instance
-cache = CacheService()
+# Global cache instance, configured from the environment:
+#   REDIS_URL, REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT,
+#   CACHE_COMPRESSION=zstd compresses stored values
+cache = CacheService(
+    url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+    socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "1.0")),
+    socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", "2.0")),
+    compress=os.getenv("CACHE_COMPRESSION", "").lower() == "zstd"
+)
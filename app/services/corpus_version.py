@@ -0,0 +1,97 @@
+from app.services.cache_service import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusVersion:
+    """
+    Generation counter of the indexed corpus, shared through Redis.
+
+    Bumped whenever documents are ingested or deleted. Cached search results
+    record the generation they were computed at and are only served while it
+    is still current, so a change to the corpus invalidates them all at once
+    without scanning or deleting cache entries.
+
+    A bump attempted while Redis is unreachable is remembered and applied on
+    the next access that reaches Redis, so entries cached before the change
+    aren't served as current after Redis recovers.
+    """
+
+    KEY = "corpus:generation"
+
+    def __init__(self, cache_service=None):
+        """
+        Args:
+            cache_service: CacheService holding the counter (defaults to the shared cache)
+        """
+        self.cache = cache_service or cache
+        # A bump that couldn't reach Redis; applied on the first successful access after recovery
+        self._pending_bump = False
+
+    def _missed_bump(self, error: Exception = None):
+        if error is not None:
+            self.cache.record_failure(error)
+        self._pending_bump = True
+        logger.warning(f"Could not bump the corpus generation ({error or 'Redis unavailable'}); "
+                       f"it will be bumped once Redis is reachable again")
+
+    def current(self) -> int:
+        """Current generation (0 before the first change or when Redis is unavailable)."""
+        if not self.cache.enabled:
+            return 0
+        try:
+            if self._pending_bump:
+                return self.bump()
+            generation = int(self.cache.redis.get(self.KEY) or 0)
+            self.cache.record_success()
+            return generation
+        except Exception as e:
+            self.cache.record_failure(e)
+            return 0
+
+    def bump(self) -> int:
+        """Start a new generation; returns it (0 when Redis is unavailable, the bump is then retried on recovery)."""
+        if not self.cache.enabled:
+            self._missed_bump()
+            return 0
+        try:
+            generation = self.cache.redis.incr(self.KEY)
+            self.cache.record_success()
+            self._pending_bump = False
+            return generation
+        except Exception as e:
+            self._missed_bump(e)
+            return 0
+
+    async def acurrent(self) -> int:
+        """Async variant of current using redis.asyncio."""
+        if not self.cache.enabled:
+            return 0
+        try:
+            if self._pending_bump:
+                return await self.abump()
+            generation = int(await self.cache.async_redis.get(self.KEY) or 0)
+            self.cache.record_success()
+            return generation
+        except Exception as e:
+            self.cache.record_failure(e)
+            return 0
+
+    async def abump(self) -> int:
+        """Async variant of bump using redis.asyncio."""
+        if not self.cache.enabled:
+            self._missed_bump()
+            return 0
+        try:
+            generation = await self.cache.async_redis.incr(self.KEY)
+            self.cache.record_success()
+            self._pending_bump = False
+            return generation
+        except Exception as e:
+            self._missed_bump(e)
+            return 0
+
+
+# Global corpus version shared by the ingestion pipeline and the search caches
+corpus_version = CorpusVersion()
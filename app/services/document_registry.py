@@ -0,0 +1,206 @@
+from qdrant_client.models import (
+    PointStruct, Filter, FieldCondition, MatchValue, PayloadSchemaType
+)
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """
+    One record per stored document, in a small payload-only Qdrant collection.
+
+    Records (filename, document_id, total_chunks, uploaded_at, content_hash) are written by
+    the ingestion pipeline once a document is stored, so listing files and
+    checking a filename cost O(files) / one indexed count instead of scrolling
+    every chunk of the chunk collection.
+    """
+
+    def __init__(self, client, async_client=None, collection_name: str = "documents_registry",
+                 chunks_collection: Optional[str] = None):
+        """
+        Args:
+            client: QdrantClient
+            async_client: AsyncQdrantClient used by ``aregister`` (optional)
+            collection_name: Registry collection
+            chunks_collection: Chunk collection to backfill from when the registry is first created
+        """
+        self.client = client
+        self.async_client = async_client
+        self.collection_name = collection_name
+        self.chunks_collection = chunks_collection
+        self._initialized = False
+
+    @staticmethod
+    def record_id(document_id: str) -> str:
+        """Point id of a document's record (stable, so re-registering overwrites it)."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"registry:{document_id}"))
+
+    def _ensure_collection_exists(self):
+        """Create the registry (no vectors, keyword index on filename) and backfill it on first use."""
+        if self._initialized:
+            return
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(collection_name=self.collection_name, vectors_config={})
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="filename",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+            logger.info(f"Registry collection '{self.collection_name}' created")
+            if self.chunks_collection and self.client.collection_exists(self.chunks_collection):
+                self.rebuild()
+        self._initialized = True
+
+    async def aensure_collection_exists(self):
+        """Async variant of _ensure_collection_exists: the one-off setup (and backfill) runs in a thread."""
+        if self._initialized:
+            return
+        await asyncio.to_thread(self._ensure_collection_exists)
+
+    def _record(self, document_id: str, filename: str, total_chunks: int, uploaded_at: Optional[str],
+                content_hash: Optional[str] = None) -> PointStruct:
+        return PointStruct(
+            id=self.record_id(document_id),
+            vector={},
+            payload={
+                "filename": filename,
+                "document_id": document_id,
+                "total_chunks": total_chunks,
+                "uploaded_at": uploaded_at or datetime.now().isoformat(),
+                "content_hash": content_hash
+            }
+        )
+
+    def register(self, document_id: str, filename: str, total_chunks: int, uploaded_at: Optional[str] = None,
+                 content_hash: Optional[str] = None):
+        """Add or replace the record of a document (``content_hash`` fingerprints the whole file)."""
+        self._ensure_collection_exists()
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[self._record(document_id, filename, total_chunks, uploaded_at, content_hash)]
+        )
+
+    async def aregister(self, document_id: str, filename: str, total_chunks: int, uploaded_at: Optional[str] = None,
+                        content_hash: Optional[str] = None):
+        """Async variant of register."""
+        await self.aensure_collection_exists()
+        await self.async_client.upsert(
+            collection_name=self.collection_name,
+            points=[self._record(document_id, filename, total_chunks, uploaded_at, content_hash)]
+        )
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Record of a document, or None when it isn't registered."""
+        self._ensure_collection_exists()
+        points = self.client.retrieve(collection_name=self.collection_name, ids=[self.record_id(document_id)])
+        return points[0].payload if points else None
+
+    async def aget(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Async variant of get."""
+        await self.aensure_collection_exists()
+        points = await self.async_client.retrieve(collection_name=self.collection_name, ids=[self.record_id(document_id)])
+        return points[0].payload if points else None
+
+    def remove(self, document_id: str):
+        """Delete the record of a document."""
+        self._ensure_collection_exists()
+        self.client.delete(collection_name=self.collection_name, points_selector=[self.record_id(document_id)])
+
+    async def aremove(self, document_id: str):
+        """Async variant of remove."""
+        await self.aensure_collection_exists()
+        await self.async_client.delete(collection_name=self.collection_name, points_selector=[self.record_id(document_id)])
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """All records, paging through the registry."""
+        self._ensure_collection_exists()
+        documents, offset = [], None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            documents.extend(point.payload for point in points)
+            if offset is None:
+                return documents
+
+    def filename_exists(self, filename: str) -> bool:
+        """Exact check through the filename index."""
+        self._ensure_collection_exists()
+        return self.client.count(
+            collection_name=self.collection_name,
+            count_filter=Filter(must=[FieldCondition(key="filename", match=MatchValue(value=filename))]),
+            exact=True
+        ).count > 0
+
+    def rebuild(self) -> int:
+        """
+        Recreate every record from the chunk collection (for chunks stored before
+        the registry existed). Pages through all chunks, reading only the
+        payload fields needed.
+
+        Returns:
+            Number of documents registered
+        """
+        documents: Dict[str, Dict[str, Any]] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.chunks_collection,
+                limit=1000,
+                offset=offset,
+                with_payload=["document_id", "title", "uploaded_at"],
+                with_vectors=False
+            )
+            for point in points:
+                payload = point.payload
+                record = documents.setdefault(payload.get("document_id"), {
+                    "filename": payload.get("title", "Unknown"),
+                    "total_chunks": 0,
+                    "uploaded_at": payload.get("uploaded_at")
+                })
+                record["total_chunks"] += 1
+            if offset is None:
+                break
+
+        records = [
+            self._record(document_id, record["filename"], record["total_chunks"], record["uploaded_at"])
+            for document_id, record in documents.items()
+        ]
+        for start in range(0, len(records), 1000):
+            self.client.upsert(collection_name=self.collection_name, points=records[start:start + 1000])
+        logger.info(f"Registry rebuilt with {len(records)} documents from '{self.chunks_collection}'")
+        return len(records)
+
+
+# Example usage (for testing only, against the in-memory Qdrant client):
+if __name__ == "__main__":
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import VectorParams, Distance
+
+    client = QdrantClient(":memory:")
+    client.create_collection("chunks", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    client.upsert("chunks", points=[
+        PointStruct(id=i, vector=[1.0, float(i)], payload={"document_id": "old", "title": "old.txt", "chunk_index": i})
+        for i in range(1500)
+    ])
+
+    registry = DocumentRegistry(client, collection_name="chunks_registry", chunks_collection="chunks")
+    registry.register("new", "new.md", total_chunks=3, content_hash="abc")
+    assert registry.get("new")["content_hash"] == "abc" and registry.get("missing") is None
+
+    assert registry.filename_exists("old.txt") and registry.filename_exists("new.md")
+    assert not registry.filename_exists("missing.txt")
+    registry.register("gone", "gone.txt", total_chunks=1)
+    registry.remove("gone")
+    assert registry.get("gone") is None
+    assert {d["filename"]: d["total_chunks"] for d in registry.list_documents()} == {"old.txt": 1500, "new.md": 3}
+    print(registry.list_documents())
@@ -1,83 +1,439 @@
-from elasticsearch import Elasticsearch
-from typing import List, Dict, Any
+from elasticsearch import Elasticsearch, AsyncElasticsearch, helpers
+from typing import List, Dict, Any, Optional, Union
+import asyncio
+import logging
 import numpy as np
 from ..config import settings
 
+logger = logging.getLogger(__name__)
+
+# Bump when the index mapping changes; migrate_index() reindexes into "<alias>_v<INDEX_VERSION>"
+INDEX_VERSION = 4
+
 class ElasticsearchService:
-    def __init__(self):
+    def __init__(self, bulk_chunk_size: int = 500, bulk_workers: int = 4,
+                 refresh: Union[bool, str] = False, bulk_max_retries: int = 3,
+                 knn_num_candidates: int = 100):
+        """
+        Args:
+            bulk_chunk_size: Documents per bulk request
+            bulk_workers: Bulk requests in flight at once in astore_document_chunks
+            refresh: Refresh policy for chunk writes (False, True or "wait_for")
+            bulk_max_retries: Retries with backoff for documents rejected with 429
+            knn_num_candidates: Minimum HNSW candidates per shard for kNN search
+                                (raised to 10 * k for larger k)
+        """
         self.es = Elasticsearch(settings.elasticsearch_host)
+        # Async client for the async FastAPI handlers (doesn't block the event loop)
+        self.async_es = AsyncElasticsearch(settings.elasticsearch_host)
+        # Alias that reads and writes go through; it points at the versioned physical index
         self.index_name = "documents"
+        self.physical_index = f"{self.index_name}_v{INDEX_VERSION}"
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_workers = bulk_workers
+        self.refresh = refresh
+        self.bulk_max_retries = bulk_max_retries
+        self.knn_num_candidates = knn_num_candidates
+        # False while the alias still points at a pre-kNN index (falls back to script_score)
+        self._knn_enabled = True
+        # ".keyword" while the alias points at an index with dynamically mapped metadata
+        self._keyword_suffix = ""
         self._initialized = False
-    
-    def _ensure_index_exists(self): 
-        """Ensure the Elasticsearch index exists with the correct mapping."""
-        if self._initialized:
-            return
-        if not self.es.indices.exists(index=self.index_name):
-            mapping = {
-                "mappings": {
-                    "properties": {
-                        "content": {"type": "text"},
-                        "metadata": {"type": "object"},
-                        "embedding": {"type": "dense_vector", "dims": settings.vector_size}
+
+    def _index_mapping(self) -> Dict[str, Any]:
+        """Mapping used when creating the index: analyzed content for BM25 (english stemming plus
+        an unstemmed subfield for exact terms), typed metadata for filters and an HNSW-indexed
+        dense_vector for native kNN."""
+        return {
+            "mappings": {
+                "properties": {
+                    "content": {
+                        "type": "text",
+                        "analyzer": "english",
+                        "fields": {
+                            "exact": {"type": "text", "analyzer": "standard"}
+                        }
+                    },
+                    "metadata": {
+                        "properties": {
+                            "title": {
+                                "type": "text",
+                                "fields": {
+                                    "keyword": {"type": "keyword"}
+                                }
+                            },
+                            "document_id": {"type": "keyword"},
+                            "chunk_index": {"type": "integer"},
+                            "content_hash": {"type": "keyword", "index": False},
+                            "uploaded_at": {"type": "date"}
+                        }
+                    },
+                    "embedding": {
+                        "type": "dense_vector",
+                        "dims": settings.vector_size,
+                        "index": True,
+                        "similarity": "cosine"
                     }
                 }
             }
-            self.es.indices.create(index=self.index_name, body=mapping)
+        }
+
+    def _current_index(self) -> Optional[str]:
+        """Physical index behind self.index_name: the alias target, a legacy concrete index, or None."""
+        if self.es.indices.exists_alias(name=self.index_name):
+            return next(iter(self.es.indices.get_alias(name=self.index_name)))
+        if self.es.indices.exists(index=self.index_name):
+            return self.index_name
+        return None
+
+    def _ensure_index_exists(self):
+        """Ensure the Elasticsearch index exists with the correct mapping."""
+        if self._initialized:
+            return
+        current = self._current_index()
+        if current is None:
+            body = self._index_mapping()
+            body["aliases"] = {self.index_name: {}}
+            self.es.indices.create(index=self.physical_index, body=body)
+            current = self.physical_index
+        self._knn_enabled = current == self.physical_index or self._supports_knn(current)
+        self._keyword_suffix = "" if current == self.physical_index or self._has_typed_metadata(current) else ".keyword"
+        if not self._knn_enabled:
+            logger.warning(f"Index '{current}' predates mapping v{INDEX_VERSION}; using brute-force search "
+                           f"until it is migrated (python scripts/migrate_es_index.py)")
         self._initialized = True
-    
-    def store_document_chunks(self, document_id: str, chunks: List[str], title: str = "Untitled"):
-        """Store document chunks with OpenAI embeddings in Elasticsearch. Embeddings are generated inside, matching QdrantService interface."""
-        self._ensure_index_exists()
-        from .openai_service import get_embeddings
+
+    def _supports_knn(self, index: str) -> bool:
+        """Whether an existing index maps the embedding as an HNSW-indexed dense_vector."""
+        mapping = self.es.indices.get_mapping(index=index)[index]["mappings"]
+        return mapping.get("properties", {}).get("embedding", {}).get("index") is True
+
+    def _has_typed_metadata(self, index: str) -> bool:
+        """Whether an existing index maps metadata.document_id as a keyword (otherwise dynamic text + .keyword)."""
+        mapping = self.es.indices.get_mapping(index=index)[index]["mappings"]
+        metadata = mapping.get("properties", {}).get("metadata", {}).get("properties", {})
+        return metadata.get("document_id", {}).get("type") == "keyword"
+
+    async def _aensure_index_exists(self):
+        """Async variant of _ensure_index_exists (runs once per process, off the event loop)."""
+        if self._initialized:
+            return
+        await asyncio.to_thread(self._ensure_index_exists)
+
+    def migrate_index(self, delete_old: bool = True) -> Dict[str, Any]:
+        """
+        Reindex the current index into the versioned index with the latest mapping
+        and atomically point the alias at it.
+
+        Legacy setups have a concrete index named "documents"; it is removed in the same
+        atomic alias update. Chunks written while the reindex runs may be missed, so run
+        it during a quiet period (or re-upload afterwards).
+
+        Returns:
+            Source index, target index and number of reindexed documents
+        """
+        source = self._current_index()
+        target = self.physical_index
+        if source == target:
+            return {"migrated": False, "index": target}
+
+        if not self.es.indices.exists(index=target):
+            self.es.indices.create(index=target, body=self._index_mapping())
+
+        reindexed = 0
+        actions = [{"add": {"index": target, "alias": self.index_name}}]
+        if source is not None:
+            response = self.es.options(request_timeout=3600).reindex(
+                source={"index": source},
+                dest={"index": target},
+                wait_for_completion=True,
+                refresh=True
+            )
+            reindexed = response.get("total", 0)
+            if source == self.index_name:
+                # A concrete index can't share its name with the alias: drop it in the same update
+                actions.append({"remove_index": {"index": source}})
+            else:
+                actions.append({"remove": {"index": source, "alias": self.index_name}})
+        self.es.indices.update_aliases(actions=actions)
+
+        if delete_old and source not in (None, self.index_name):
+            self.es.indices.delete(index=source)
+
+        self._initialized = False
+        logger.info(f"Migrated '{source}' -> '{target}' ({reindexed} documents)")
+        return {"migrated": True, "source": source, "index": target, "documents": reindexed}
+
+    def _build_docs(self, document_id: str, chunks: List[str], title: str,
+                    embeddings: List[List[float]], start_index: int) -> List[Dict[str, Any]]:
+        """Build one index document per chunk."""
         from datetime import datetime
-        embeddings = get_embeddings(chunks)
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        from ..document_loader.chunker import chunk_hash
+        docs = []
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index):
             # Ensure embedding is a list (OpenAI returns lists, not numpy arrays)
             if not isinstance(embedding, list):
                 embedding = list(embedding)
-                
-            doc = {
+
+            docs.append({
                 "content": chunk,
                 "metadata": {
                     "title": title,
                     "uploaded_at": datetime.now().isoformat(),
                     "document_id": document_id,
-                    "chunk_index": i
+                    "chunk_index": i,
+                    "content_hash": chunk_hash(chunk)
                 },
-                "embedding": embedding  
+                "embedding": embedding
+            })
+        return docs
+
+    @staticmethod
+    def doc_id(document_id: str, chunk_index: int) -> str:
+        """Deterministic id of a chunk (document_id + chunk_index), so retries and re-ingestion overwrite."""
+        return f"{document_id}_{chunk_index}"
+
+    def _build_actions(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Bulk index actions with deterministic ids (see doc_id)."""
+        return [
+            {
+                "_index": self.index_name,
+                "_id": self.doc_id(doc['metadata']['document_id'], doc['metadata']['chunk_index']),
+                "_source": doc
             }
-            self.es.index(index=self.index_name, body=doc)
-    
-    def search(self, text: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents using OpenAI embeddings. Generates embeddings internally."""
+            for doc in docs
+        ]
+
+    def store_document_chunks(self, document_id: str, chunks: List[str], title: str = "Untitled",
+                              embeddings: List[List[float]] = None, start_index: int = 0):
+        """Store document chunks with OpenAI embeddings in Elasticsearch. Matches QdrantService interface:
+        embeddings are generated inside unless precomputed ones are passed in.
+        Chunks are written with the bulk API; documents rejected with 429 are retried with backoff."""
         self._ensure_index_exists()
-        from .openai_service import get_embeddings
-        
-        # Get embedding for query
-        query_embedding = get_embeddings([text])[0]
-        
+        if embeddings is None:
+            from .openai_service import get_embeddings
+            embeddings = get_embeddings(chunks)
+        actions = self._build_actions(self._build_docs(document_id, chunks, title, embeddings, start_index))
+        results = helpers.streaming_bulk(
+            self.es, actions,
+            chunk_size=self.bulk_chunk_size,
+            max_retries=self.bulk_max_retries,
+            refresh=self.refresh
+        )
+        # The helper is lazy; consuming it sends the requests (failures raise BulkIndexError)
+        indexed = sum(1 for ok, _ in results if ok)
+        logger.info(f"Bulk indexed {indexed} chunks for document {document_id}")
+        return indexed
+
+    async def astore_document_chunks(self, document_id: str, chunks: List[str], title: str = "Untitled",
+                                     embeddings: List[List[float]] = None, start_index: int = 0):
+        """Async variant of store_document_chunks: bulk requests of bulk_chunk_size documents,
+        at most bulk_workers in flight."""
+        await self._aensure_index_exists()
+        if embeddings is None:
+            from .openai_service import aget_embeddings
+            embeddings = await aget_embeddings(chunks)
+        actions = self._build_actions(self._build_docs(document_id, chunks, title, embeddings, start_index))
+        semaphore = asyncio.Semaphore(self.bulk_workers)
+
+        async def send(batch):
+            async with semaphore:
+                indexed, _ = await helpers.async_bulk(
+                    self.async_es, batch,
+                    chunk_size=self.bulk_chunk_size,
+                    max_retries=self.bulk_max_retries,
+                    refresh=self.refresh
+                )
+                return indexed
+
+        batches = [actions[i:i + self.bulk_chunk_size] for i in range(0, len(actions), self.bulk_chunk_size)]
+        indexed = sum(await asyncio.gather(*(send(batch) for batch in batches)))
+        logger.info(f"Bulk indexed {indexed} chunks for document {document_id}")
+        return indexed
+
+    def _hashes_from_mget(self, response) -> Dict[int, str]:
+        return {
+            doc["_source"]["metadata"]["chunk_index"]: doc["_source"]["metadata"].get("content_hash")
+            for doc in response["docs"] if doc.get("found")
+        }
+
+    def chunk_hashes(self, document_id: str, start_index: int, count: int) -> Dict[int, str]:
+        """Stored content hash per chunk_index for chunks start_index..start_index+count-1 (missing ones omitted).
+        Uses a realtime multi-get, so chunks written but not yet refreshed are seen too."""
+        self._ensure_index_exists()
+        response = self.es.mget(
+            index=self.index_name,
+            ids=[self.doc_id(document_id, i) for i in range(start_index, start_index + count)],
+            source_includes=["metadata.chunk_index", "metadata.content_hash"]
+        )
+        return self._hashes_from_mget(response)
+
+    async def achunk_hashes(self, document_id: str, start_index: int, count: int) -> Dict[int, str]:
+        """Async variant of chunk_hashes."""
+        await self._aensure_index_exists()
+        response = await self.async_es.mget(
+            index=self.index_name,
+            ids=[self.doc_id(document_id, i) for i in range(start_index, start_index + count)],
+            source_includes=["metadata.chunk_index", "metadata.content_hash"]
+        )
+        return self._hashes_from_mget(response)
+
+    def _chunks_from_query(self, document_id: str, chunk_count: int) -> Dict[str, Any]:
+        return {
+            "bool": {
+                "filter": [
+                    {"term": {f"metadata.document_id{self._keyword_suffix}": document_id}},
+                    {"range": {"metadata.chunk_index": {"gte": chunk_count}}}
+                ]
+            }
+        }
+
+    def delete_chunks_from(self, document_id: str, chunk_count: int) -> int:
+        """Delete the chunks of a document with chunk_index >= chunk_count (left over from a longer revision).
+
+        Refreshes the index afterwards, so the chunks bulk-indexed before it (with the
+        default refresh=False) are searchable once the ingestion pipeline, which calls
+        it last, bumps the corpus generation.
+
+        Returns:
+            Number of chunks deleted
+        """
+        self._ensure_index_exists()
+        response = self.es.delete_by_query(
+            index=self.index_name,
+            query=self._chunks_from_query(document_id, chunk_count),
+            conflicts="proceed",
+            refresh=True
+        )
+        return response["deleted"]
+
+    async def adelete_chunks_from(self, document_id: str, chunk_count: int) -> int:
+        """Async variant of delete_chunks_from."""
+        await self._aensure_index_exists()
+        response = await self.async_es.delete_by_query(
+            index=self.index_name,
+            query=self._chunks_from_query(document_id, chunk_count),
+            conflicts="proceed",
+            refresh=True
+        )
+        return response["deleted"]
+
+    def _uploaded_at_update(self, document_id: str, uploaded_at: str) -> Dict[str, Any]:
+        return dict(
+            index=self.index_name,
+            query={"term": {f"metadata.document_id{self._keyword_suffix}": document_id}},
+            script={"source": "ctx._source.metadata.uploaded_at = params.uploaded_at",
+                    "params": {"uploaded_at": uploaded_at}},
+            conflicts="proceed",
+            refresh=True
+        )
+
+    def set_uploaded_at(self, document_id: str, uploaded_at: str) -> int:
+        """Set ``metadata.uploaded_at`` on every chunk of a document (partial update, no re-embedding).
+
+        Used after an incremental re-ingest, so chunks that weren't rewritten carry the
+        new upload time too. Refreshes the index, like delete_chunks_from.
+
+        Returns:
+            Number of chunks updated
+        """
+        self._ensure_index_exists()
+        return self.es.update_by_query(**self._uploaded_at_update(document_id, uploaded_at))["updated"]
+
+    async def aset_uploaded_at(self, document_id: str, uploaded_at: str) -> int:
+        """Async variant of set_uploaded_at."""
+        await self._aensure_index_exists()
+        return (await self.async_es.update_by_query(**self._uploaded_at_update(document_id, uploaded_at)))["updated"]
+
+    def delete_document(self, document_id: str) -> int:
+        """Delete every chunk of a document; returns the number deleted."""
+        return self.delete_chunks_from(document_id, 0)
+
+    async def adelete_document(self, document_id: str) -> int:
+        """Async variant of delete_document."""
+        return await self.adelete_chunks_from(document_id, 0)
+
+    def _build_filter(self, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Bool filter clauses from search filters (same keys as QdrantService._build_filter):
+        ``document_ids``, ``titles``, ``uploaded_after`` and ``uploaded_before``.
+        """
+        if not filters:
+            return []
+        clauses = []
+        if filters.get("document_ids"):
+            clauses.append({"terms": {f"metadata.document_id{self._keyword_suffix}": list(filters["document_ids"])}})
+        if filters.get("titles"):
+            clauses.append({"terms": {"metadata.title.keyword": list(filters["titles"])}})
+        uploaded_range = {
+            bound: value.isoformat() if hasattr(value, "isoformat") else value
+            for bound, value in (("gte", filters.get("uploaded_after")), ("lte", filters.get("uploaded_before")))
+            if value
+        }
+        if uploaded_range:
+            clauses.append({"range": {"metadata.uploaded_at": uploaded_range}})
+        return clauses
+
+    def _build_search_query(self, query_embedding: List[float], top_k: int,
+                            filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """kNN search body for a query vector, optionally restricted by ``filters``."""
         # Ensure it's a list
         if not isinstance(query_embedding, list):
             query_embedding = list(query_embedding)
-        
-        # Perform kNN search using script_score
-        query = {
+        filter_clauses = self._build_filter(filters)
+
+        if self._knn_enabled:
+            # Approximate kNN over the HNSW graph instead of scoring every document
+            knn = {
+                "field": "embedding",
+                "query_vector": query_embedding,
+                "k": top_k,
+                "num_candidates": min(max(self.knn_num_candidates, top_k * 10), 10000)
+            }
+            if filter_clauses:
+                # Applied during the graph search, so k matches are still returned
+                knn["filter"] = filter_clauses
+            return {
+                "size": top_k,
+                "knn": knn,
+                "_source": {"excludes": ["embedding"]}
+            }
+
+        # Legacy index without HNSW: exact kNN search using script_score
+        return {
             "size": top_k,
             "query": {
                 "script_score": {
-                    "query": {"match_all": {}},
+                    "query": {"bool": {"filter": filter_clauses}} if filter_clauses else {"match_all": {}},
                     "script": {
                         "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
                         "params": {"query_vector": query_embedding}
                     }
                 }
+            },
+            "_source": {"excludes": ["embedding"]}
+        }
+
+    def _build_lexical_query(self, text: str, top_k: int, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """BM25 search body: stemmed content, exact-term subfield and title, optionally restricted by ``filters``."""
+        query = {
+            "multi_match": {
+                "query": text,
+                "fields": ["content", "content.exact^2", "metadata.title"],
+                "type": "most_fields"
             }
         }
-        
-        response = self.es.search(index=self.index_name, body=query)
-        
-        # Format results
+        filter_clauses = self._build_filter(filters)
+        if filter_clauses:
+            query = {"bool": {"must": query, "filter": filter_clauses}}
+        return {
+            "size": top_k,
+            "query": query,
+            "_source": {"excludes": ["embedding"]}
+        }
+
+    def _format_hits(self, response) -> List[Dict[str, Any]]:
+        """Format search hits as content, metadata and score."""
         results = []
         for hit in response['hits']['hits']:
             results.append({
@@ -85,5 +441,44 @@ class ElasticsearchService:
                 'metadata': hit['_source']['metadata'],
                 'score': hit['_score']
             })
-        
+
         return results
+
+    def search(self, text: str, top_k: int = 5, vector: List[float] = None,
+               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents using OpenAI embeddings. Generates embeddings internally
+        unless a precomputed query ``vector`` is passed in; ``filters`` restrict the candidates."""
+        self._ensure_index_exists()
+
+        # Get embedding for query
+        if vector is None:
+            from .openai_service import get_embeddings
+            vector = get_embeddings([text])[0]
+
+        response = self.es.search(index=self.index_name, body=self._build_search_query(vector, top_k, filters))
+        return self._format_hits(response)
+
+    async def asearch(self, text: str, top_k: int = 5, vector: List[float] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Async variant of search using AsyncElasticsearch."""
+        await self._aensure_index_exists()
+
+        if vector is None:
+            from .openai_service import aget_embeddings
+            vector = (await aget_embeddings([text]))[0]
+
+        response = await self.async_es.search(index=self.index_name, body=self._build_search_query(vector, top_k, filters))
+        return self._format_hits(response)
+
+    def search_lexical(self, text: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """BM25 keyword search on the content field (no embedding needed)."""
+        self._ensure_index_exists()
+        response = self.es.search(index=self.index_name, body=self._build_lexical_query(text, top_k, filters))
+        return self._format_hits(response)
+
+    async def asearch_lexical(self, text: str, top_k: int = 5,
+                              filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Async variant of search_lexical using AsyncElasticsearch."""
+        await self._aensure_index_exists()
+        response = await self.async_es.search(index=self.index_name, body=self._build_lexical_query(text, top_k, filters))
+        return self._format_hits(response)
@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from app.services.cache_service import cache
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store in front of the embedding model.
+
+    Vectors are keyed by sha256(model + text) and looked up in two tiers:
+    an in-process LRU, then Redis. Only texts missing from both tiers are
+    sent to the model, in one batched call.
+
+    The in-process tier holds float32 arrays (6 KB for 1536 dimensions, a
+    list of Python floats takes ~50 KB) and is bounded by both item count and
+    bytes; vectors are converted back to lists only when returned.
+    """
+
+    def __init__(self, redis_cache=None, max_memory_items: int = 10000,
+                 max_memory_bytes: int = 64 * 1024 * 1024, ttl: int = 7 * 24 * 3600,
+                 prefix: str = "embedding:"):
+        """
+        Args:
+            redis_cache: CacheService used as the shared tier (None for memory only)
+            max_memory_items: Maximum number of vectors kept in the in-process LRU
+            max_memory_bytes: Maximum float32 bytes kept in the in-process LRU
+            ttl: Expiration of Redis entries in seconds (default 7 days)
+            prefix: Redis key prefix
+        """
+        self.redis_cache = redis_cache
+        self.max_memory_items = max_memory_items
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl = ttl
+        self.prefix = prefix
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content hash of the model name and the text."""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is None:
+                return None
+            self._memory.move_to_end(key)
+        return vector.tolist()
+
+    def _memory_set(self, key: str, vector: List[float]):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.nbytes
+            self._memory[key] = vector
+            self._memory_bytes += vector.nbytes
+            while self._memory and (len(self._memory) > self.max_memory_items
+                                    or self._memory_bytes > self.max_memory_bytes):
+                self._memory_bytes -= self._memory.popitem(last=False)[1].nbytes
+
+    def _memory_lookup(self, texts: List[str], model: str):
+        """First tier: returns cache keys, vectors found in memory and positions still missing."""
+        keys = [self.make_key(model, text) for text in texts]
+        vectors = [self._memory_get(key) for key in keys]
+        self.memory_hits += sum(1 for v in vectors if v is not None)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        return keys, vectors, missing
+
+    def _merge_redis(self, keys: List[str], vectors: list, missing: List[int], found: list):
+        """Second tier: place Redis hits, promote them to memory and count the misses."""
+        for i, vector in zip(missing, found):
+            if vector is not None:
+                vectors[i] = vector
+                self._memory_set(keys[i], vector)
+                self.redis_hits += 1
+        self.misses += sum(1 for v in vectors if v is None)
+        return vectors
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """
+        Look up cached vectors for a batch of texts.
+
+        Returns:
+            One entry per text: the vector, or None on a miss
+        """
+        keys, vectors, missing = self._memory_lookup(texts, model)
+        found = []
+        if missing and self.redis_cache is not None:
+            found = self.redis_cache.get_many([self.prefix + keys[i] for i in missing])
+        return self._merge_redis(keys, vectors, missing, found)
+
+    async def aget_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """Async variant of ``get_many`` (Redis tier via redis.asyncio)."""
+        keys, vectors, missing = self._memory_lookup(texts, model)
+        found = []
+        if missing and self.redis_cache is not None:
+            found = await self.redis_cache.aget_many([self.prefix + keys[i] for i in missing])
+        return self._merge_redis(keys, vectors, missing, found)
+
+    def _memory_store(self, texts: List[str], model: str, vectors: List[List[float]]) -> Dict[str, List[float]]:
+        """Store vectors in memory; returns the Redis key -> vector mapping for the second tier."""
+        keys = [self.make_key(model, text) for text in texts]
+        for key, vector in zip(keys, vectors):
+            self._memory_set(key, vector)
+        return {self.prefix + key: vector for key, vector in zip(keys, vectors)}
+
+    def set_many(self, texts: List[str], model: str, vectors: List[List[float]]):
+        """Store vectors for a batch of texts in both tiers."""
+        mapping = self._memory_store(texts, model, vectors)
+        if self.redis_cache is not None:
+            self.redis_cache.set_vectors(mapping, ttl=self.ttl)
+
+    async def aset_many(self, texts: List[str], model: str, vectors: List[List[float]]):
+        """Async variant of ``set_many``."""
+        mapping = self._memory_store(texts, model, vectors)
+        if self.redis_cache is not None:
+            await self.redis_cache.aset_vectors(mapping, ttl=self.ttl)
+
+    def _pending(self, texts: List[str], vectors: List[Optional[List[float]]]) -> Dict[str, List[int]]:
+        """Map each missing text to its positions, so repeated chunks are embedded only once."""
+        pending: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                pending.setdefault(texts[i], []).append(i)
+        return pending
+
+    def _fill(self, vectors: list, pending: Dict[str, List[int]], computed: list):
+        """Place computed vectors at their positions."""
+        for text, vector in zip(pending, computed):
+            for i in pending[text]:
+                vectors[i] = vector
+        logger.info(f"Embedding cache: {len(vectors) - sum(len(v) for v in pending.values())} hits, "
+                    f"{len(pending)} texts sent to the model")
+
+    def get_or_compute(self, texts: List[str], model: str, compute_fn: Callable) -> List[List[float]]:
+        """
+        Return vectors for all texts, computing only the cache misses.
+
+        Args:
+            texts: Texts to embed
+            model: Embedding model name (part of the cache key)
+            compute_fn: Function embedding a list of texts, called once with the misses
+
+        Returns:
+            List of vectors in the same order as ``texts``
+        """
+        vectors = self.get_many(texts, model)
+        pending = self._pending(texts, vectors)
+        if pending:
+            missing_texts = list(pending)
+            computed = compute_fn(missing_texts)
+            self._fill(vectors, pending, computed)
+            self.set_many(missing_texts, model, computed)
+        return vectors
+
+    async def aget_or_compute(self, texts: List[str], model: str, compute_fn: Callable) -> List[List[float]]:
+        """Async variant of ``get_or_compute``; ``compute_fn`` is a coroutine function."""
+        vectors = await self.aget_many(texts, model)
+        pending = self._pending(texts, vectors)
+        if pending:
+            missing_texts = list(pending)
+            computed = await compute_fn(missing_texts)
+            self._fill(vectors, pending, computed)
+            await self.aset_many(missing_texts, model, computed)
+        return vectors
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters since process start."""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.redis_hits) / lookups, 3) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes
+        }
+
+
+# Global embedding cache backed by the shared Redis cache
+embedding_cache = EmbeddingCache(redis_cache=cache)
+
+# Example usage (for testing only, with a fake embedding client):
+if __name__ == "__main__":
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    test_cache = EmbeddingCache(redis_cache=None, max_memory_items=2)
+    first = test_cache.get_or_compute(["alpha", "beta", "alpha"], "fake-model", fake_embed)
+    second = test_cache.get_or_compute(["alpha", "beta", "gamma"], "fake-model", fake_embed)
+
+    assert first == [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert second == [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert calls == [["alpha", "beta"], ["gamma"]], calls
+
+    # The byte budget bounds the in-process tier too (8 bytes per 2-dim float32 vector)
+    small_cache = EmbeddingCache(redis_cache=None, max_memory_bytes=16)
+    small_cache.get_or_compute(["a", "bb", "ccc"], "fake-model", fake_embed)
+    assert small_cache.stats()["memory_items"] == 2 and small_cache.stats()["memory_bytes"] == 16
+    print(f"Model calls: {calls}")
+    print(f"Stats: {test_cache.stats()}")
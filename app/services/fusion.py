@@ -0,0 +1,85 @@
+from typing import Dict, Hashable, List, Sequence, Tuple
+import numpy as np
+
+# Ranked candidates of one retrieval leg: (key, backend score), best first
+RankedList = List[Tuple[Hashable, float]]
+
+FUSION_STRATEGIES = ("rrf", "minmax", "zscore")
+
+
+def _rrf(scores: np.ndarray, ranks: np.ndarray, present: np.ndarray, rrf_k: int) -> np.ndarray:
+    """Reciprocal Rank Fusion: 1 / (k + rank), ignores score scales entirely."""
+    return np.where(present, 1.0 / (rrf_k + ranks), 0.0)
+
+
+def _minmax(scores: np.ndarray, ranks: np.ndarray, present: np.ndarray, rrf_k: int) -> np.ndarray:
+    """Min-max normalize each leg's real scores to [0, 1]; missing candidates get 0."""
+    low = np.where(present, scores, np.inf).min(axis=1, keepdims=True)
+    high = np.where(present, scores, -np.inf).max(axis=1, keepdims=True)
+    span = high - low
+    # A leg whose candidates all share one score gives each of them full credit
+    normalized = np.divide(scores - low, span, out=np.ones_like(scores), where=span > 0)
+    return np.where(present, normalized, 0.0)
+
+
+def _zscore(scores: np.ndarray, ranks: np.ndarray, present: np.ndarray, rrf_k: int) -> np.ndarray:
+    """Standardize each leg's real scores; missing candidates get the leg's lowest z-score."""
+    counts = np.maximum(present.sum(axis=1, keepdims=True), 1)
+    mean = np.where(present, scores, 0.0).sum(axis=1, keepdims=True) / counts
+    var = np.where(present, (scores - mean) ** 2, 0.0).sum(axis=1, keepdims=True) / counts
+    std = np.sqrt(var)
+    z = np.divide(scores - mean, std, out=np.zeros_like(scores), where=std > 0)
+    floor = np.where(present, z, np.inf).min(axis=1, keepdims=True)
+    floor = np.where(np.isfinite(floor), floor, 0.0)
+    return np.where(present, z, floor)
+
+
+_NORMALIZERS = {"rrf": _rrf, "minmax": _minmax, "zscore": _zscore}
+
+
+def fuse(legs: Sequence[RankedList], weights: Sequence[float], strategy: str = "rrf",
+         rrf_k: int = 60) -> Tuple[List[Hashable], np.ndarray, np.ndarray]:
+    """
+    Fuse ranked lists from several retrieval legs into one ranking.
+
+    Candidates are laid out once in a (legs x candidates) score matrix, so
+    normalization and weighting are vectorized whatever the candidate count.
+
+    Args:
+        legs: One ranked list of (key, score) per leg, best first
+        weights: Weight of each leg in the fused score
+        strategy: "rrf", "minmax" or "zscore"
+        rrf_k: Rank offset for RRF (60 is the usual default)
+
+    Returns:
+        (keys, fused_scores, leg_scores): keys sorted by fused score (descending),
+        their fused scores, and the raw backend scores per leg (NaN where absent)
+    """
+    if strategy not in _NORMALIZERS:
+        raise ValueError(f"Unknown fusion strategy '{strategy}', expected one of {FUSION_STRATEGIES}")
+
+    keys = list(dict.fromkeys(key for leg in legs for key, _ in leg))
+    if not keys:
+        return [], np.zeros(0), np.zeros((len(legs), 0))
+    position: Dict[Hashable, int] = {key: i for i, key in enumerate(keys)}
+
+    shape = (len(legs), len(keys))
+    scores = np.zeros(shape)
+    ranks = np.full(shape, np.inf)
+    present = np.zeros(shape, dtype=bool)
+    for row, leg in enumerate(legs):
+        if not leg:
+            continue
+        # Keep the first (best-ranked) occurrence if a leg repeats a key
+        columns, first = np.unique(np.fromiter((position[key] for key, _ in leg), dtype=np.int64, count=len(leg)),
+                                   return_index=True)
+        leg_scores = np.fromiter((score for _, score in leg), dtype=np.float64, count=len(leg))
+        scores[row, columns] = leg_scores[first]
+        ranks[row, columns] = first + 1
+        present[row, columns] = True
+
+    normalized = _NORMALIZERS[strategy](scores, ranks, present, rrf_k)
+    fused = np.asarray(weights, dtype=np.float64) @ normalized
+    order = np.argsort(-fused, kind="stable")
+    leg_scores = np.where(present, scores, np.nan)
+    return [keys[i] for i in order], fused[order], leg_scores[:, order]
@@ -0,0 +1,343 @@
+from ..document_loader.chunker import iter_file_chunks
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("completed", "failed")
+
+
+class IngestionJobQueue:
+    """
+    Background ingestion of uploaded files.
+
+    Uploads are spooled to ``spool_dir`` and queued as jobs; ``workers``
+    asyncio tasks run them through the ingestion pipeline, so the upload
+    request returns as soon as the file is on disk. At most ``max_queued``
+    jobs wait at a time; ``submit`` raises ``asyncio.QueueFull`` beyond that.
+
+    Every state change is appended to a JSONL journal. On ``start`` the
+    journal is replayed: jobs that were queued or running when the process
+    stopped are queued again from their spooled file (ingestion is
+    idempotent, so a resumed job only embeds the chunks not stored yet).
+
+    A journal belongs to one process: ``start`` takes an exclusive lock on
+    ``<journal>.lock``, and when another process (e.g. another uvicorn
+    worker) holds it, moves on to ``<name>.1.jsonl``, ``<name>.2.jsonl``, ...
+    until it finds a free one. Restarting with the same number of processes
+    therefore resumes every journal exactly once.
+
+    Work on one document is serialized through ``document_lock``: jobs for
+    the same document (same file name) run one after the other, and other
+    writers (replace, delete) take the same lock.
+    """
+
+    def __init__(self, pipeline_factory: Callable, journal_path: str = "ingestion_jobs.jsonl",
+                 spool_dir: str = "ingestion_spool", max_queued: int = 100, workers: int = 2,
+                 keep_finished: int = 1000, chunk_size: int = 500, overlap: int = 50):
+        """
+        Args:
+            pipeline_factory: Returns the IngestionPipeline a job runs through
+            journal_path: Append-only job journal, replayed on start (numbered variants are
+                          used when other processes hold it, see above)
+            spool_dir: Directory holding uploaded files until their job finishes
+            max_queued: Jobs allowed to wait before submissions are rejected
+            workers: Jobs ingested concurrently
+            keep_finished: Finished jobs kept (most recent first); older ones are dropped from memory and the journal
+            chunk_size: Characters per chunk
+            overlap: Characters shared by consecutive chunks
+        """
+        self.pipeline_factory = pipeline_factory
+        self.journal_path = journal_path
+        self._base_journal_path = journal_path
+        self._journal_lock_file = None
+        self.spool_dir = spool_dir
+        self.max_queued = max_queued
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # document_id -> [lock, holders and waiters], dropped when unused
+        self._document_locks: Dict[str, list] = {}
+        # Orders journal appends and compactions (the file I/O itself runs in a thread)
+        self._journal_lock = asyncio.Lock()
+        self._journal_lines = 0
+
+    @property
+    def full(self) -> bool:
+        """Whether a new submission would be rejected."""
+        return self._queue is not None and self._queue.qsize() >= self.max_queued
+
+    @asynccontextmanager
+    async def document_lock(self, document_id: str):
+        """Hold the document's lock, so concurrent ingestions can't interleave their writes."""
+        entry = self._document_locks.setdefault(document_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._document_locks[document_id]
+
+    def spool_path(self, job_id: str, suffix: str = "") -> str:
+        """Where the upload of a job is spooled."""
+        return os.path.join(self.spool_dir, f"{job_id}{suffix}")
+
+    def _append_line(self, line: str):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _journal(self, job: Dict[str, Any]):
+        """Append the job's current state and flush it to disk (off the event loop)."""
+        line = json.dumps(job) + "\n"
+        async with self._journal_lock:
+            await asyncio.to_thread(self._append_line, line)
+            self._journal_lines += 1
+
+    def _claim_journal(self):
+        """Lock the first journal path no other process holds and switch to it."""
+        if fcntl is None:
+            # No flock on this platform: single process only
+            return
+        base, ext = os.path.splitext(self._base_journal_path)
+        for slot in itertools.count():
+            path = self._base_journal_path if slot == 0 else f"{base}.{slot}{ext}"
+            lock_file = open(f"{path}.lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            self.journal_path = path
+            self._journal_lock_file = lock_file
+            if slot:
+                logger.info(f"{self._base_journal_path} is held by another process, using {path}")
+            return
+
+    def _release_journal(self):
+        if self._journal_lock_file is not None:
+            # Closing the file releases the lock
+            self._journal_lock_file.close()
+            self._journal_lock_file = None
+            self.journal_path = self._base_journal_path
+
+    def _replay_journal(self) -> List[Dict[str, Any]]:
+        """Load the latest state of every journaled job; returns the unfinished ones."""
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    job = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from a crash mid-write
+                    continue
+                self.jobs[job["job_id"]] = job
+
+        unfinished = []
+        for job in self.jobs.values():
+            if job["status"] in FINISHED:
+                continue
+            if os.path.exists(job["path"]):
+                job.update(status="queued", resumed=True)
+                unfinished.append(job)
+            else:
+                job.update(status="failed", error="Spooled upload is missing", finished_at=datetime.now().isoformat())
+        self._trim_finished()
+        return sorted(unfinished, key=lambda job: job["created_at"])
+
+    def _trim_finished(self) -> bool:
+        """Forget the oldest finished jobs beyond ``keep_finished``; returns whether any were dropped."""
+        finished = [job for job in self.jobs.values() if job["status"] in FINISHED]
+        if len(finished) <= self.keep_finished:
+            return False
+        finished.sort(key=lambda job: job.get("finished_at") or "")
+        for job in finished[:len(finished) - self.keep_finished]:
+            del self.jobs[job["job_id"]]
+        return True
+
+    def _rewrite_journal(self, lines: List[str]):
+        """Replace the journal with ``lines`` (atomic replace)."""
+        temp_path = f"{self.journal_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+
+    async def _compact_journal(self):
+        """Rewrite the journal with one line per remaining job (off the event loop)."""
+        async with self._journal_lock:
+            lines = [json.dumps(job) + "\n" for job in self.jobs.values()]
+            await asyncio.to_thread(self._rewrite_journal, lines)
+            self._journal_lines = len(lines)
+
+    async def _maintain(self):
+        """Bound memory and journal size while running: trim finished jobs, compact when the journal has grown."""
+        if self._trim_finished() or self._journal_lines > 2 * len(self.jobs) + 100:
+            await self._compact_journal()
+
+    async def start(self):
+        """Replay the journal, queue the unfinished jobs and start the workers (once)."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        await asyncio.to_thread(os.makedirs, self.spool_dir, exist_ok=True)
+        await asyncio.to_thread(self._claim_journal)
+        resumed = await asyncio.to_thread(self._replay_journal)
+        await self._compact_journal()
+        for job in resumed:
+            self._queue.put_nowait(job["job_id"])
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} ingestion jobs from {self.journal_path}")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; running jobs stay journaled as running and resume on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._release_journal()
+
+    async def submit(self, job_id: str, document_id: str, title: str, path: str,
+                     content_hash: Optional[str] = None, spool_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Queue a spooled upload for ingestion.
+
+        Raises:
+            asyncio.QueueFull: ``max_queued`` jobs are already waiting
+        """
+        await self.start()
+        if self.full:
+            raise asyncio.QueueFull()
+        job = {
+            "job_id": job_id,
+            "document_id": document_id,
+            "title": title,
+            "path": path,
+            "content_hash": content_hash,
+            "status": "queued",
+            "created_at": datetime.now().isoformat(),
+            "stages": {"spool_ms": spool_ms},
+            "chunks": {"processed": 0}
+        }
+        self.jobs[job_id] = job
+        await self._journal(job)
+        self._queue.put_nowait(job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job (None when unknown)."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != "path"}
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(self.jobs[job_id])
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict[str, Any]):
+        """Ingest one job, recording stage timings and chunk counts."""
+        started = datetime.now()
+        job.update(status="running", started_at=started.isoformat())
+        job["stages"]["queued_ms"] = round((started - datetime.fromisoformat(job["created_at"])).total_seconds() * 1000, 1)
+        await self._journal(job)
+
+        start = time.perf_counter()
+        try:
+            async with self.document_lock(job["document_id"]):
+                job["stages"]["lock_wait_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                summary = await self.pipeline_factory().arun(
+                    document_id=job["document_id"],
+                    chunks=iter_file_chunks(job["path"], chunk_size=self.chunk_size, overlap=self.overlap),
+                    title=job["title"],
+                    progress=lambda processed: job["chunks"].update(processed=processed),
+                    content_hash=job["content_hash"]
+                )
+            job["chunks"].update(summary)
+            job.update(status="completed")
+        except asyncio.CancelledError:
+            # Shutting down: left as running in the journal, resumed on the next start
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion job {job['job_id']} failed: {e}")
+            job.update(status="failed", error=str(e))
+
+        job["stages"]["ingest_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        job["finished_at"] = datetime.now().isoformat()
+        await self._journal(job)
+        try:
+            await asyncio.to_thread(os.remove, job["path"])
+        except OSError:
+            pass
+        await self._maintain()
+        logger.info(f"Ingestion job {job['job_id']} {job['status']} in {job['stages']['ingest_ms']}ms: {job['chunks']}")
+
+
+# Example usage (for testing only, with a fake pipeline):
+if __name__ == "__main__":
+    import tempfile
+
+    class FakePipeline:
+        async def arun(self, document_id, chunks, title, progress=None, content_hash=None):
+            count = 0
+            for count, _ in enumerate(chunks, start=1):
+                await asyncio.sleep(0.001)
+                progress(count)
+            return {"chunks": count, "embedded": count, "unchanged": 0, "removed": 0}
+
+    async def main():
+        workdir = tempfile.mkdtemp()
+        journal = os.path.join(workdir, "jobs.jsonl")
+        # No workers, so the submitted jobs stay queued and the third one is rejected
+        queue = IngestionJobQueue(FakePipeline, journal_path=journal, spool_dir=os.path.join(workdir, "spool"),
+                                  max_queued=2, workers=0)
+        await queue.start()
+        for i in range(2):
+            path = queue.spool_path(f"job-{i}", ".txt")
+            with open(path, "w") as f:
+                f.write("lorem ipsum " * 1000)
+            await queue.submit(f"job-{i}", f"doc-{i}", f"file-{i}.txt", path)
+        try:
+            await queue.submit("job-2", "doc-2", "file-2.txt", queue.spool_path("job-2"))
+        except asyncio.QueueFull:
+            print("job-2 rejected: queue full")
+
+        # Simulate a crash before the jobs ran, then resume from the journal
+        await queue.stop()
+        print({job_id: job["status"] for job_id, job in queue.jobs.items()})
+
+        restarted = IngestionJobQueue(FakePipeline, journal_path=journal, spool_dir=queue.spool_dir, workers=2)
+        await restarted.start()
+        await restarted._queue.join()
+        for job_id in restarted.jobs:
+            print(restarted.get(job_id))
+        await restarted.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,336 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+from itertools import islice
+import asyncio
+import logging
+import time
+import uuid
+
+from ..document_loader.chunker import chunk_hash
+
+logger = logging.getLogger(__name__)
+
+
+def document_id_for(title: str) -> str:
+    """Stable document id for a file name, so re-uploading a file updates it in place."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"document:{title}"))
+
+
+class IngestionPipeline:
+    """
+    Embed-once ingestion stage.
+
+    Each batch of chunks is embedded a single time and the same vectors are
+    handed to every configured store (Qdrant, Elasticsearch, ...), instead of
+    every store calling the embedding model on its own.
+
+    Ingestion is idempotent: chunks are stored under ids derived from
+    (document_id, chunk_index), so re-running a document overwrites it. When
+    every store exposes ``chunk_hashes``, only chunks whose text changed since
+    the last run are re-embedded and written, and chunks beyond the new end of
+    the document are deleted (``delete_chunks_from``). When the document
+    changed, the chunks left as they were then get the new upload time through
+    a payload-only update (``set_uploaded_at``), so upload-date filters see the
+    whole document; an unchanged document keeps its recorded upload time.
+
+    When a ``registry`` is given, each stored document is recorded in it
+    (filename, chunk count, upload time, file hash); a file whose hash matches
+    its record is skipped without reading its chunks. The hash is cleared
+    before the first write and only recorded again once the run succeeds, so
+    a run that fails halfway is never mistaken for an unchanged file. When a
+    ``corpus_version`` is given it is bumped after every document that
+    changed, which invalidates search results cached before the upload.
+    """
+
+    def __init__(self, stores: list, embed_fn: Optional[Callable] = None, aembed_fn: Optional[Callable] = None,
+                 batch_size: int = 100, max_workers: int = 4, registry=None, corpus_version=None):
+        """
+        Args:
+            stores: Objects exposing ``store_document_chunks(document_id, chunks, title,
+                    embeddings=..., start_index=...)`` and optionally ``chunk_hashes`` /
+                    ``delete_chunks_from`` / ``set_uploaded_at`` (plus their async variants)
+            embed_fn: Function mapping a list of texts to a list of vectors
+                      (defaults to ``openai_service.get_embeddings``)
+            aembed_fn: Coroutine function used by ``arun``
+                       (defaults to ``openai_service.aget_embeddings``, imported on first use)
+            batch_size: Number of chunks embedded and written per batch
+            max_workers: Batches processed concurrently by ``arun``
+            registry: DocumentRegistry updated once the document is stored (optional)
+            corpus_version: CorpusVersion bumped once the document is stored (optional)
+        """
+        if embed_fn is None:
+            from .openai_service import get_embeddings
+            embed_fn = get_embeddings
+        self.stores = stores
+        self.embed_fn = embed_fn
+        self.aembed_fn = aembed_fn
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.registry = registry
+        self.corpus_version = corpus_version
+
+    def _batches(self, chunks: Iterable[str]) -> Iterator[Tuple[int, List[str]]]:
+        """(start_index, chunks) per batch, pulling from the iterable lazily."""
+        iterator = iter(chunks)
+        start = 0
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield start, batch
+            start += len(batch)
+
+    def _tracks_hashes(self, name: str) -> bool:
+        """Whether every store can report stored chunk hashes (otherwise every chunk is rewritten)."""
+        return all(hasattr(store, name) for store in self.stores)
+
+    @staticmethod
+    def _changed(start: int, batch: List[str], stored_hashes: Optional[List[Dict[int, str]]]) -> List[int]:
+        """Positions in ``batch`` whose text differs from what any store holds at that chunk_index."""
+        if stored_hashes is None:
+            return list(range(len(batch)))
+        return [
+            i for i, chunk in enumerate(batch)
+            if any(hashes.get(start + i) != chunk_hash(chunk) for hashes in stored_hashes)
+        ]
+
+    @staticmethod
+    def _runs(start: int, batch: List[str], changed: List[int], embeddings: list):
+        """Split the changed chunks into contiguous runs: (start_index, chunks, embeddings) per run."""
+        first = 0
+        for k in range(1, len(changed) + 1):
+            if k == len(changed) or changed[k] != changed[k - 1] + 1:
+                yield start + changed[first], [batch[i] for i in changed[first:k]], embeddings[first:k]
+                first = k
+
+    def _report(self, document_id: str, stored: int, start_time: float, progress: Optional[Callable]):
+        elapsed = time.time() - start_time
+        logger.info(f"Document {document_id}: {stored} chunks processed ({stored / elapsed if elapsed else 0:.0f}/s)")
+        if progress is not None:
+            progress(stored)
+
+    @staticmethod
+    def _unchanged_file(previous: Optional[Dict], content_hash: Optional[str]) -> bool:
+        return bool(content_hash) and previous is not None and previous.get("content_hash") == content_hash
+
+    @staticmethod
+    def _summary(total: int, embedded: int, previous: Optional[Dict]) -> Dict[str, int]:
+        removed = max(previous["total_chunks"] - total, 0) if previous else 0
+        return {"chunks": total, "embedded": embedded, "unchanged": total - embedded, "removed": removed}
+
+    @staticmethod
+    def _modified(summary: Dict[str, int], previous: Optional[Dict]) -> bool:
+        return summary["embedded"] > 0 or previous is None or previous["total_chunks"] != summary["chunks"]
+
+    def run(self, document_id: str, chunks: Iterable[str], title: str = "Untitled",
+            progress: Optional[Callable[[int], None]] = None, content_hash: Optional[str] = None) -> Dict[str, int]:
+        """
+        Embed and store all chunks of a document, one batch at a time.
+
+        Args:
+            chunks: Chunk texts; a generator is consumed lazily, so only one
+                    batch of chunks and vectors is held in memory
+            progress: Called with the number of chunks processed so far after each batch
+            content_hash: Fingerprint of the whole file; when it matches the
+                          registry record the document is left as it is
+
+        Returns:
+            Counts of chunks in the document, (re-)embedded, unchanged and removed
+        """
+        start_time = time.time()
+        uploaded_at = datetime.now().isoformat()
+        previous = self.registry.get(document_id) if self.registry is not None else None
+        if self._unchanged_file(previous, content_hash):
+            logger.info(f"Document {document_id} is unchanged, skipping ingestion")
+            return self._summary(previous["total_chunks"], 0, previous)
+        if previous is not None and previous.get("content_hash"):
+            # The stores are about to diverge from the recorded file: drop its hash until this run succeeds
+            self.registry.register(document_id, previous["filename"], previous["total_chunks"],
+                                   uploaded_at=previous.get("uploaded_at"))
+
+        tracks_hashes = self._tracks_hashes("chunk_hashes")
+        total = embedded = 0
+        for start, batch in self._batches(chunks):
+            stored_hashes = None
+            if tracks_hashes:
+                stored_hashes = [store.chunk_hashes(document_id, start, len(batch)) for store in self.stores]
+            changed = self._changed(start, batch, stored_hashes)
+            if changed:
+                embeddings = self.embed_fn([batch[i] for i in changed])
+                for run_start, run_chunks, run_embeddings in self._runs(start, batch, changed, embeddings):
+                    for store in self.stores:
+                        store.store_document_chunks(
+                            document_id=document_id,
+                            chunks=run_chunks,
+                            title=title,
+                            embeddings=run_embeddings,
+                            start_index=run_start
+                        )
+            total += len(batch)
+            embedded += len(changed)
+            self._report(document_id, total, start_time, progress)
+
+        # Chunks past the new end are left over from a longer revision (or an interrupted run).
+        # The stores apply this delete after every earlier write and wait for it (Qdrant) or
+        # refresh (Elasticsearch), so the document is searchable before the generation is bumped
+        for store in self.stores:
+            if hasattr(store, "delete_chunks_from"):
+                store.delete_chunks_from(document_id, total)
+        summary = self._summary(total, embedded, previous)
+        modified = self._modified(summary, previous)
+        if not modified:
+            # Same chunks as before: the document keeps its recorded upload time
+            uploaded_at = previous.get("uploaded_at") or uploaded_at
+        elif summary["unchanged"]:
+            # Chunks that weren't rewritten still carry the previous upload time
+            for store in self.stores:
+                if hasattr(store, "set_uploaded_at"):
+                    store.set_uploaded_at(document_id, uploaded_at)
+        if self.registry is not None:
+            self.registry.register(document_id, title, total, uploaded_at=uploaded_at, content_hash=content_hash)
+        if self.corpus_version is not None and modified:
+            self.corpus_version.bump()
+        logger.info(f"Ingested document {document_id} into {len(self.stores)} stores in "
+                    f"{time.time() - start_time:.2f}s: {summary}")
+        return summary
+
+    async def _astore_batch(self, document_id: str, title: str, start: int, batch: List[str],
+                            tracks_hashes: bool) -> int:
+        """Embed the changed chunks of one batch and write them to every store without blocking the event loop.
+
+        Returns:
+            Number of chunks embedded
+        """
+        stored_hashes = None
+        if tracks_hashes:
+            stored_hashes = await asyncio.gather(*(
+                store.achunk_hashes(document_id, start, len(batch)) for store in self.stores
+            ))
+        changed = self._changed(start, batch, stored_hashes)
+        if not changed:
+            return 0
+        if self.aembed_fn is None:
+            from .openai_service import aget_embeddings
+            self.aembed_fn = aget_embeddings
+        embeddings = await self.aembed_fn([batch[i] for i in changed], batch_size=self.batch_size)
+        for run_start, run_chunks, run_embeddings in self._runs(start, batch, changed, embeddings):
+            kwargs = dict(document_id=document_id, chunks=run_chunks, title=title,
+                          embeddings=run_embeddings, start_index=run_start)
+            for store in self.stores:
+                if hasattr(store, "astore_document_chunks"):
+                    await store.astore_document_chunks(**kwargs)
+                else:
+                    await asyncio.to_thread(store.store_document_chunks, **kwargs)
+        return len(changed)
+
+    async def arun(self, document_id: str, chunks: Iterable[str], title: str = "Untitled",
+                   progress: Optional[Callable[[int], None]] = None,
+                   content_hash: Optional[str] = None) -> Dict[str, int]:
+        """
+        Async variant of ``run``: up to ``max_workers`` batches are embedded and
+        written concurrently (through the store's ``astore_document_chunks``
+        when it has one). The next batch is only pulled from ``chunks`` when a
+        worker is free, so memory stays bounded by ``max_workers * batch_size``
+        chunks whatever the document size.
+
+        Returns:
+            Counts of chunks in the document, (re-)embedded, unchanged and removed
+        """
+        start_time = time.time()
+        uploaded_at = datetime.now().isoformat()
+        previous = await self.registry.aget(document_id) if self.registry is not None else None
+        if self._unchanged_file(previous, content_hash):
+            logger.info(f"Document {document_id} is unchanged, skipping ingestion")
+            return self._summary(previous["total_chunks"], 0, previous)
+        if previous is not None and previous.get("content_hash"):
+            # The stores are about to diverge from the recorded file: drop its hash until this run succeeds
+            await self.registry.aregister(document_id, previous["filename"], previous["total_chunks"],
+                                          uploaded_at=previous.get("uploaded_at"))
+
+        tracks_hashes = self._tracks_hashes("achunk_hashes")
+        total = embedded = 0
+        slots = asyncio.Semaphore(self.max_workers)
+        pending = set()
+
+        async def worker(start: int, batch: List[str]):
+            nonlocal total, embedded
+            try:
+                batch_embedded = await self._astore_batch(document_id, title, start, batch, tracks_hashes)
+                embedded += batch_embedded
+                total += len(batch)
+                self._report(document_id, total, start_time, progress)
+            finally:
+                slots.release()
+
+        try:
+            for start, batch in self._batches(chunks):
+                await slots.acquire()
+                # Surface a failed batch before queueing more work
+                for task in [task for task in pending if task.done()]:
+                    pending.discard(task)
+                    task.result()
+                pending.add(asyncio.create_task(worker(start, batch)))
+            await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+        # Chunks past the new end are left over from a longer revision (or an interrupted run).
+        # The stores apply this delete after every earlier write and wait for it (Qdrant) or
+        # refresh (Elasticsearch), so the document is searchable before the generation is bumped
+        await asyncio.gather(*(
+            store.adelete_chunks_from(document_id, total)
+            for store in self.stores if hasattr(store, "adelete_chunks_from")
+        ))
+        summary = self._summary(total, embedded, previous)
+        modified = self._modified(summary, previous)
+        if not modified:
+            # Same chunks as before: the document keeps its recorded upload time
+            uploaded_at = previous.get("uploaded_at") or uploaded_at
+        elif summary["unchanged"]:
+            # Chunks that weren't rewritten still carry the previous upload time
+            await asyncio.gather(*(
+                store.aset_uploaded_at(document_id, uploaded_at)
+                for store in self.stores if hasattr(store, "aset_uploaded_at")
+            ))
+        if self.registry is not None:
+            await self.registry.aregister(document_id, title, total, uploaded_at=uploaded_at,
+                                          content_hash=content_hash)
+        if self.corpus_version is not None and modified:
+            await self.corpus_version.abump()
+        logger.info(f"Ingested document {document_id} into {len(self.stores)} stores in "
+                    f"{time.time() - start_time:.2f}s: {summary}")
+        return summary
+
+    def delete(self, document_id: str) -> Optional[Dict]:
+        """
+        Remove a document from every store and from the registry, and bump the corpus generation.
+
+        Returns:
+            The document's registry record (None when it wasn't registered)
+        """
+        previous = self.registry.get(document_id) if self.registry is not None else None
+        for store in self.stores:
+            store.delete_document(document_id)
+        if self.registry is not None:
+            self.registry.remove(document_id)
+        if self.corpus_version is not None:
+            self.corpus_version.bump()
+        logger.info(f"Deleted document {document_id} from {len(self.stores)} stores")
+        return previous
+
+    async def adelete(self, document_id: str) -> Optional[Dict]:
+        """Async variant of ``delete``: the stores are cleared concurrently."""
+        previous = await self.registry.aget(document_id) if self.registry is not None else None
+        await asyncio.gather(*(
+            store.adelete_document(document_id) if hasattr(store, "adelete_document")
+            else asyncio.to_thread(store.delete_document, document_id)
+            for store in self.stores
+        ))
+        if self.registry is not None:
+            await self.registry.aremove(document_id)
+        if self.corpus_version is not None:
+            await self.corpus_version.abump()
+        logger.info(f"Deleted document {document_id} from {len(self.stores)} stores")
+        return previous
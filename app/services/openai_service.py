@@ -1,6 +1,9 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from ..config import settings
+from .embedding_cache import embedding_cache
+import asyncio
 import logging
+import random
 import time
 
 logger = logging.getLogger(__name__)
@@ -13,17 +16,37 @@ client = OpenAI(
     max_retries=2
 )
 
-def get_embeddings(texts, model="text-embedding-3-small", batch_size=100):
+# Async client for the FastAPI handlers; retries are handled in aget_embeddings
+async_client = AsyncOpenAI(
+    api_key=settings.openai_api_key,
+    timeout=30.0,
+    max_retries=0
+)
+
+# Errors worth retrying with backoff (rate limits, timeouts, transient 5xx)
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+def get_embeddings(texts, model="text-embedding-3-small", batch_size=100, use_cache=True):
     """
     Generate embeddings for a list of text chunks using OpenAI API.
+    Texts already in the embedding cache are not sent to the API.
     Args:
         texts (list of str): The text chunks to embed.
         model (str): The embedding model to use.
+        use_cache (bool): Look up and store vectors in the embedding cache.
     Returns:
         list: List of embedding vectors (list of floats).
     """
     if not isinstance(texts, list):
         texts = [texts]
+    if use_cache:
+        return embedding_cache.get_or_compute(
+            texts, model, lambda missing: _create_embeddings(missing, model, batch_size)
+        )
+    return _create_embeddings(texts, model, batch_size)
+
+def _create_embeddings(texts, model, batch_size):
+    """Call the OpenAI embeddings API in batches of ``batch_size`` texts."""
     embeddings = []
     logger.info(f"Generating embeddings for {len(texts)} texts in batches of {batch_size}")
     start_time = time.time()
@@ -49,6 +72,71 @@ def get_embeddings(texts, model="text-embedding-3-small", batch_size=100):
     logger.info(f"Total embedding generation took {total_time:.2f}s for {len(texts)} texts")
     return embeddings
 
+async def aget_embeddings(texts, model="text-embedding-3-small", batch_size=100, use_cache=True,
+                          max_concurrency=8, max_retries=5):
+    """
+    Async variant of get_embeddings using AsyncOpenAI.
+    Batches are sent concurrently (at most ``max_concurrency`` in flight) and
+    results are returned in input order.
+    Args:
+        texts (list of str): The text chunks to embed.
+        model (str): The embedding model to use.
+        use_cache (bool): Look up and store vectors in the embedding cache.
+        max_concurrency (int): Maximum number of concurrent API requests.
+        max_retries (int): Retries per batch on rate limits and transient errors.
+    Returns:
+        list: List of embedding vectors (list of floats).
+    """
+    if not isinstance(texts, list):
+        texts = [texts]
+    if use_cache:
+        return await embedding_cache.aget_or_compute(
+            texts, model, lambda missing: _acreate_embeddings(missing, model, batch_size, max_concurrency, max_retries)
+        )
+    return await _acreate_embeddings(texts, model, batch_size, max_concurrency, max_retries)
+
+def _retry_delay(error, attempt, base_delay=0.5, max_delay=20.0):
+    """Backoff delay: the server's Retry-After header if given, else exponential with jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), max_delay)
+        except (TypeError, ValueError):
+            pass
+    return min(base_delay * 2 ** attempt, max_delay) * random.uniform(0.5, 1.0)
+
+async def _acreate_embeddings(texts, model, batch_size, max_concurrency, max_retries):
+    """Call the OpenAI embeddings API with concurrent batches, keeping input order."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    logger.info(f"Generating embeddings for {len(texts)} texts in batches of {batch_size} "
+                f"({max_concurrency} concurrent)")
+    start_time = time.time()
+
+    async def embed_batch(batch_number, batch):
+        for attempt in range(max_retries + 1):
+            async with semaphore:
+                batch_start = time.time()
+                try:
+                    response = await async_client.embeddings.create(input=batch, model=model)
+                    logger.info(f"Batch {batch_number} ({len(batch)} texts) took {time.time() - batch_start:.2f}s")
+                    return [list(item.embedding) for item in response.data]
+                except RETRYABLE_ERRORS as e:
+                    if attempt == max_retries:
+                        logger.error(f"Error generating embeddings after {max_retries} retries: {e}")
+                        raise
+                    delay = _retry_delay(e, attempt)
+                    error_name = type(e).__name__
+            # Sleep outside the semaphore so other batches can use the slot
+            logger.warning(f"Batch {batch_number} retrying in {delay:.2f}s ({error_name})")
+            await asyncio.sleep(delay)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*(embed_batch(n + 1, batch) for n, batch in enumerate(batches)))
+    embeddings = [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    logger.info(f"Total embedding generation took {time.time() - start_time:.2f}s for {len(texts)} texts")
+    return embeddings
+
 # Example usage (for testing only):
 if __name__ == "__main__":
     test_chunks = [
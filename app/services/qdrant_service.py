@@ -1,21 +1,59 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    PointStruct, PayloadSchemaType,
+    Filter, FieldCondition, MatchAny, MatchValue, DatetimeRange, Range, FilterSelector
+)
 from ..config import settings
-from .openai_service import get_embeddings
+from ..document_loader.chunker import chunk_hash
+from .openai_service import get_embeddings, aget_embeddings
+from .document_registry import DocumentRegistry
+from .qdrant_storage import StorageOptions
 from datetime import datetime
+from typing import Any, Dict, Optional
+import asyncio
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Payload fields indexed for filtered search
+PAYLOAD_INDEXES = {
+    "title": PayloadSchemaType.KEYWORD,
+    "document_id": PayloadSchemaType.KEYWORD,
+    "chunk_index": PayloadSchemaType.INTEGER,
+    "uploaded_at": PayloadSchemaType.DATETIME,
+}
+
 class QdrantService:
-    def __init__(self, collection_name: str = None):
+    def __init__(self, collection_name: str = None, storage: StorageOptions = None,
+                 upsert_batch_size: int = 256, upsert_wait: bool = False):
+        """
+        Args:
+            collection_name: Chunk collection (defaults to settings.default_collection)
+            storage: Quantization, on-disk and HNSW options (defaults to float32 in RAM)
+            upsert_batch_size: Points per upsert request
+            upsert_wait: Wait until each upsert is applied; False returns once Qdrant has
+                         accepted the points (they become searchable moments later).
+                         ``delete_chunks_from``, the last write of an ingestion, always waits
+        """
         self.collection_name = collection_name or settings.default_collection
+        self.storage = storage or StorageOptions()
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_wait = upsert_wait
         self.qdrant_client = QdrantClient(settings.qdrant_url)
+        # Async client for the async FastAPI handlers (doesn't block the event loop)
+        self.async_client = AsyncQdrantClient(settings.qdrant_url)
+        # One record per document (filename, chunk count, upload time), written at ingest
+        self.registry = DocumentRegistry(
+            self.qdrant_client,
+            self.async_client,
+            collection_name=f"{self.collection_name}_registry",
+            chunks_collection=self.collection_name
+        )
         self._initialized = False
     
     def _ensure_collection_exists(self):
-        """Ensure the collection exists with the correct vector size (1536)."""
+        """Ensure the collection exists with the correct vector size (1536) and its payload indexes."""
         if self._initialized:
             return
         try:
@@ -23,42 +61,115 @@ class QdrantService:
             if not self.qdrant_client.collection_exists(self.collection_name):
                 self.qdrant_client.create_collection(
                     collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
+                    **self.storage.collection_config(1536)
+                )
+                logger.info(f"Collection '{self.collection_name}' created successfully")
+            # Creating an index that already exists is a no-op, so older collections get them too
+            for field_name, field_schema in PAYLOAD_INDEXES.items():
+                self.qdrant_client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                )
+            self._initialized = True
+        except Exception as e:
+            logger.error(f"Error ensuring collection exists: {e}")
+            raise
+
+    async def _aensure_collection_exists(self):
+        """Async variant of _ensure_collection_exists."""
+        if self._initialized:
+            return
+        try:
+            if not await self.async_client.collection_exists(self.collection_name):
+                await self.async_client.create_collection(
+                    collection_name=self.collection_name,
+                    **self.storage.collection_config(1536)
                 )
                 logger.info(f"Collection '{self.collection_name}' created successfully")
+            for field_name, field_schema in PAYLOAD_INDEXES.items():
+                await self.async_client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                )
             self._initialized = True
         except Exception as e:
             logger.error(f"Error ensuring collection exists: {e}")
             raise
 
-    def store_document_chunks(self, document_id: str, chunks: list, title: str = "Untitled"):
-        """Store document chunks with OpenAI embeddings in Qdrant."""
+    @staticmethod
+    def point_id(document_id: str, chunk_index: int) -> str:
+        """Deterministic point id of a chunk, so re-ingesting a document overwrites its points."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}:{chunk_index}"))
+
+    def _build_points(self, document_id: str, chunks: list, title: str, embeddings: list, start_index: int):
+        """Build one PointStruct per chunk with its payload."""
+        points = []
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index):
+            # Ensure embedding is a list
+            if not isinstance(embedding, list):
+                embedding = list(embedding)
+                
+            points.append(PointStruct(
+                id=self.point_id(document_id, i),
+                vector=embedding,
+                payload={
+                    "document_id": document_id,
+                    "title": title,
+                    "chunk_index": i,
+                    "content": chunk,
+                    "content_hash": chunk_hash(chunk),
+                    "uploaded_at": datetime.now().isoformat()
+                }
+            ))
+        return points
+
+    def store_document_chunks(self, document_id: str, chunks: list, title: str = "Untitled",
+                              embeddings: list = None, start_index: int = 0):
+        """Store document chunks with OpenAI embeddings in Qdrant.
+
+        Pass precomputed ``embeddings`` to skip the embedding call (the ingestion
+        pipeline embeds once and shares the vectors across stores). ``start_index``
+        offsets ``chunk_index`` when a document is stored batch by batch.
+        """
         self._ensure_collection_exists()
         try:
-            embeddings = get_embeddings(chunks)
-            points = []
+            if embeddings is None:
+                embeddings = get_embeddings(chunks)
+            points = self._build_points(document_id, chunks, title, embeddings, start_index)
             
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                # Ensure embedding is a list
-                if not isinstance(embedding, list):
-                    embedding = list(embedding)
-                    
-                points.append(PointStruct(
-                    id=str(uuid.uuid4()),  # Generate a valid UUID for each chunk
-                    vector=embedding,
-                    payload={
-                        "document_id": document_id,
-                        "title": title,
-                        "chunk_index": i,
-                        "content": chunk,
-                        "uploaded_at": datetime.now().isoformat()
-                    }
-                ))
+            # Bounded requests instead of one huge upsert per call
+            for start in range(0, len(points), self.upsert_batch_size):
+                self.qdrant_client.upsert(
+                    collection_name=self.collection_name,
+                    points=points[start:start + self.upsert_batch_size],
+                    wait=self.upsert_wait
+                )
+            logger.info(f"Stored {len(chunks)} chunks for document {document_id}")
+            return len(chunks)
             
-            self.qdrant_client.upsert(
-                collection_name=self.collection_name,
-                points=points
-            )
+        except Exception as e:
+            logger.error(f"Error storing document chunks: {e}")
+            raise
+
+    async def astore_document_chunks(self, document_id: str, chunks: list, title: str = "Untitled",
+                                     embeddings: list = None, start_index: int = 0):
+        """Async variant of store_document_chunks using AsyncQdrantClient."""
+        await self._aensure_collection_exists()
+        try:
+            if embeddings is None:
+                embeddings = await aget_embeddings(chunks)
+            points = self._build_points(document_id, chunks, title, embeddings, start_index)
+            
+            await asyncio.gather(*(
+                self.async_client.upsert(
+                    collection_name=self.collection_name,
+                    points=points[start:start + self.upsert_batch_size],
+                    wait=self.upsert_wait
+                )
+                for start in range(0, len(points), self.upsert_batch_size)
+            ))
             logger.info(f"Stored {len(chunks)} chunks for document {document_id}")
             return len(chunks)
             
@@ -66,79 +177,187 @@ class QdrantService:
             logger.error(f"Error storing document chunks: {e}")
             raise
 
-    def search(self, text: str, limit: int = 5):
-        """Search for similar documents using OpenAI embeddings."""
+    def chunk_hashes(self, document_id: str, start_index: int, count: int) -> Dict[int, str]:
+        """Stored content hash per chunk_index for chunks start_index..start_index+count-1 (missing ones omitted)."""
+        self._ensure_collection_exists()
+        points = self.qdrant_client.retrieve(
+            collection_name=self.collection_name,
+            ids=[self.point_id(document_id, i) for i in range(start_index, start_index + count)],
+            with_payload=["chunk_index", "content_hash"],
+            with_vectors=False
+        )
+        return {point.payload["chunk_index"]: point.payload.get("content_hash") for point in points}
+
+    async def achunk_hashes(self, document_id: str, start_index: int, count: int) -> Dict[int, str]:
+        """Async variant of chunk_hashes."""
+        await self._aensure_collection_exists()
+        points = await self.async_client.retrieve(
+            collection_name=self.collection_name,
+            ids=[self.point_id(document_id, i) for i in range(start_index, start_index + count)],
+            with_payload=["chunk_index", "content_hash"],
+            with_vectors=False
+        )
+        return {point.payload["chunk_index"]: point.payload.get("content_hash") for point in points}
+
+    @staticmethod
+    def _chunks_from_filter(document_id: str, chunk_count: int) -> Filter:
+        return Filter(must=[
+            FieldCondition(key="document_id", match=MatchValue(value=document_id)),
+            FieldCondition(key="chunk_index", range=Range(gte=chunk_count))
+        ])
+
+    def delete_chunks_from(self, document_id: str, chunk_count: int):
+        """Delete the chunks of a document with chunk_index >= chunk_count (left over from a longer revision).
+
+        Waits until the delete is applied. Qdrant applies updates in order, so once this
+        returns every earlier upsert of the document is searchable too; the ingestion
+        pipeline calls it last, before registering the document and bumping the corpus generation.
+        """
+        self._ensure_collection_exists()
+        self.qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=self._chunks_from_filter(document_id, chunk_count)),
+            wait=True
+        )
+
+    async def adelete_chunks_from(self, document_id: str, chunk_count: int):
+        """Async variant of delete_chunks_from."""
+        await self._aensure_collection_exists()
+        await self.async_client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=self._chunks_from_filter(document_id, chunk_count)),
+            wait=True
+        )
+
+    @staticmethod
+    def _document_filter(document_id: str) -> Filter:
+        return Filter(must=[FieldCondition(key="document_id", match=MatchValue(value=document_id))])
+
+    def set_uploaded_at(self, document_id: str, uploaded_at: str):
+        """Set ``uploaded_at`` on every chunk of a document (payload-only update, vectors untouched).
+
+        Used after an incremental re-ingest, so chunks that weren't rewritten carry the
+        new upload time too. Waits until the update is applied, like delete_chunks_from.
+        """
+        self._ensure_collection_exists()
+        self.qdrant_client.set_payload(
+            collection_name=self.collection_name,
+            payload={"uploaded_at": uploaded_at},
+            points=FilterSelector(filter=self._document_filter(document_id)),
+            wait=True
+        )
+
+    async def aset_uploaded_at(self, document_id: str, uploaded_at: str):
+        """Async variant of set_uploaded_at."""
+        await self._aensure_collection_exists()
+        await self.async_client.set_payload(
+            collection_name=self.collection_name,
+            payload={"uploaded_at": uploaded_at},
+            points=FilterSelector(filter=self._document_filter(document_id)),
+            wait=True
+        )
+
+    def delete_document(self, document_id: str):
+        """Delete every chunk of a document (filtered delete on the indexed document_id)."""
+        self.delete_chunks_from(document_id, 0)
+
+    async def adelete_document(self, document_id: str):
+        """Async variant of delete_document."""
+        await self.adelete_chunks_from(document_id, 0)
+
+    def delete_collection(self, collection_name: Optional[str] = None):
+        """Drop a collection (the chunk collection and its registry by default)."""
+        if collection_name in (None, self.collection_name):
+            self.qdrant_client.delete_collection(self.registry.collection_name)
+            self.registry._initialized = False
+            self._initialized = False
+        self.qdrant_client.delete_collection(collection_name or self.collection_name)
+        logger.info(f"Collection '{collection_name or self.collection_name}' deleted")
+
+    @staticmethod
+    def _build_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        """
+        Qdrant filter from search filters, applied inside the HNSW search (no over-fetching).
+
+        Args:
+            filters: Optional keys ``document_ids`` and ``titles`` (match any of the values),
+                     ``uploaded_after`` and ``uploaded_before`` (datetimes or ISO strings, inclusive)
+        """
+        if not filters:
+            return None
+        conditions = []
+        if filters.get("document_ids"):
+            conditions.append(FieldCondition(key="document_id", match=MatchAny(any=list(filters["document_ids"]))))
+        if filters.get("titles"):
+            conditions.append(FieldCondition(key="title", match=MatchAny(any=list(filters["titles"]))))
+        if filters.get("uploaded_after") or filters.get("uploaded_before"):
+            conditions.append(FieldCondition(
+                key="uploaded_at",
+                range=DatetimeRange(gte=filters.get("uploaded_after"), lte=filters.get("uploaded_before"))
+            ))
+        return Filter(must=conditions) if conditions else None
+
+    def search(self, text: str, limit: int = 5, vector: list = None, filters: Optional[Dict[str, Any]] = None):
+        """Search for similar documents using OpenAI embeddings.
+
+        Pass a precomputed query ``vector`` to skip embedding ``text``, and ``filters``
+        (see ``_build_filter``) to restrict the search to some documents or upload times.
+        """
         self._ensure_collection_exists()
         try:
             # Use OpenAI embeddings for consistency with document upload
-            vector = get_embeddings([text])[0]
+            if vector is None:
+                vector = get_embeddings([text])[0]
 
             # Search for closest vectors in the collection
             search_result = self.qdrant_client.query_points(
                 collection_name=self.collection_name,
                 query=vector,
-                query_filter=None,
+                query_filter=self._build_filter(filters),
+                search_params=self.storage.search_params(),
                 limit=limit,
             ).points
             
             # Return payloads with similarity scores
-            return [hit.payload for hit in search_result]
+            return [{**hit.payload, "score": hit.score} for hit in search_result]
             
         except Exception as e:
             logger.error(f"Error searching: {e}")
             raise
 
-    def file_exists(self, filename: str):
-        """Check if a file exists in Qdrant by searching for its title."""
+    async def asearch(self, text: str, limit: int = 5, vector: list = None, filters: Optional[Dict[str, Any]] = None):
+        """Async variant of search using AsyncQdrantClient."""
+        await self._aensure_collection_exists()
         try:
-            # Search for all documents
-            search_result = self.qdrant_client.scroll(
+            if vector is None:
+                vector = (await aget_embeddings([text]))[0]
+
+            search_result = (await self.async_client.query_points(
                 collection_name=self.collection_name,
-                limit=1000,
-                with_payload=True
-            )
+                query=vector,
+                query_filter=self._build_filter(filters),
+                search_params=self.storage.search_params(),
+                limit=limit,
+            )).points
             
-            # Check if any document has this filename as title
-            points, next_page_offset = search_result
-            for point in points:
-                if point.payload.get("title") == filename:
-                    return True
-            return False
+            return [{**hit.payload, "score": hit.score} for hit in search_result]
             
+        except Exception as e:
+            logger.error(f"Error searching: {e}")
+            raise
+
+    def file_exists(self, filename: str):
+        """Check if a file exists, through the document registry (exact, no chunk scan)."""
+        try:
+            return self.registry.filename_exists(filename)
         except Exception as e:
             logger.error(f"Error checking file existence: {e}")
             return False
 
     def get_all_files(self):
-        """Get list of all unique files stored in Qdrant with metadata."""
+        """Get list of all stored files with metadata, from the document registry."""
         try:
-            # Get all documents from Qdrant
-            search_result = self.qdrant_client.scroll(
-                collection_name=self.collection_name,
-                limit=1000,
-                with_payload=True
-            )
-            
-            points, next_page_offset = search_result
-            files_info = {}
-            
-            # Group chunks by filename and collect metadata
-            for point in points:
-                payload = point.payload
-                filename = payload.get("title", "Unknown")
-                
-                if filename not in files_info:
-                    files_info[filename] = {
-                        "filename": filename,
-                        "document_id": payload.get("document_id"),
-                        "uploaded_at": payload.get("uploaded_at"),
-                        "total_chunks": 0
-                    }
-                
-                files_info[filename]["total_chunks"] += 1
-            
-            return list(files_info.values())
-            
+            return self.registry.list_documents()
         except Exception as e:
             logger.error(f"Error getting all files: {e}")
-            raise
\ No newline at end of file
+            raise
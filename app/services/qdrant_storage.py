@@ -0,0 +1,95 @@
+from qdrant_client.models import (
+    VectorParams, Distance, HnswConfigDiff, SearchParams, QuantizationSearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig
+)
+from typing import Any, Dict, Optional
+
+QUANTIZATION_MODES = ("scalar", "binary")
+
+
+class StorageOptions:
+    """
+    How a Qdrant chunk collection stores and searches its vectors.
+
+    - ``quantization``: None (float32 only), "scalar" (int8, 4x smaller) or
+      "binary" (1 bit per dimension, 32x smaller; works well for
+      text-embedding-3 vectors). The quantized vectors stay in RAM and the
+      original vectors are used to rescore the top ``oversampling * limit`` hits.
+    - ``on_disk``: keep original vectors and payloads on disk (memmap) instead of RAM
+    - ``hnsw_m`` / ``hnsw_ef_construct``: HNSW graph degree and build-time beam width
+    - ``hnsw_ef``: search-time beam width (higher = better recall, slower)
+
+    Creation options only apply when the collection is created.
+    """
+
+    def __init__(self, quantization: Optional[str] = None, on_disk: bool = False,
+                 hnsw_m: Optional[int] = None, hnsw_ef_construct: Optional[int] = None,
+                 hnsw_ef: Optional[int] = None, rescore: bool = True, oversampling: float = 2.0):
+        if quantization not in (None, *QUANTIZATION_MODES):
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_MODES}")
+        self.quantization = quantization
+        self.on_disk = on_disk
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+        self.rescore = rescore
+        self.oversampling = oversampling
+
+    def collection_config(self, vector_size: int) -> Dict[str, Any]:
+        """Keyword arguments for ``create_collection`` (besides the collection name)."""
+        config = {
+            "vectors_config": VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=self.on_disk or None),
+        }
+        if self.on_disk:
+            config["on_disk_payload"] = True
+        if self.hnsw_m is not None or self.hnsw_ef_construct is not None:
+            config["hnsw_config"] = HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+        if self.quantization == "scalar":
+            config["quantization_config"] = ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        elif self.quantization == "binary":
+            config["quantization_config"] = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return config
+
+    def search_params(self) -> Optional[SearchParams]:
+        """``search_params`` for ``query_points`` (None when the defaults apply)."""
+        if self.hnsw_ef is None and self.quantization is None:
+            return None
+        quantization = None
+        if self.quantization is not None:
+            quantization = QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        return SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def estimated_ram_bytes(self, points: int, vector_size: int) -> int:
+        """Rough resident size of vectors + HNSW links (payloads excluded)."""
+        original = 0 if self.on_disk else points * vector_size * 4
+        if self.quantization == "scalar":
+            quantized = points * vector_size
+        elif self.quantization == "binary":
+            quantized = points * vector_size // 8
+        else:
+            quantized = 0
+        links = points * (self.hnsw_m or 16) * 2 * 4
+        return original + quantized + links
+
+    @classmethod
+    def from_env(cls, environ) -> "StorageOptions":
+        """
+        Options from QDRANT_QUANTIZATION, QDRANT_ON_DISK, QDRANT_HNSW_M,
+        QDRANT_HNSW_EF_CONSTRUCT, QDRANT_HNSW_EF, QDRANT_RESCORE and QDRANT_OVERSAMPLING.
+        """
+        def optional_int(name):
+            value = environ.get(name)
+            return int(value) if value else None
+
+        return cls(
+            quantization=(environ.get("QDRANT_QUANTIZATION") or "").lower() or None,
+            on_disk=environ.get("QDRANT_ON_DISK", "").lower() in ("1", "true", "yes"),
+            hnsw_m=optional_int("QDRANT_HNSW_M"),
+            hnsw_ef_construct=optional_int("QDRANT_HNSW_EF_CONSTRUCT"),
+            hnsw_ef=optional_int("QDRANT_HNSW_EF"),
+            rescore=environ.get("QDRANT_RESCORE", "true").lower() not in ("0", "false", "no"),
+            oversampling=float(environ.get("QDRANT_OVERSAMPLING", "2.0")),
+        )
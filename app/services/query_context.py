@@ -0,0 +1,30 @@
+from typing import Callable, List, Optional
+
+
+class QueryContext:
+    """
+    Request-scoped query vector.
+
+    Holds the query text and embeds it at most once, so the semantic cache,
+    Qdrant and Elasticsearch can all reuse the same vector within a request.
+    """
+
+    def __init__(self, text: str, aembed_fn: Optional[Callable] = None):
+        """
+        Args:
+            text: Query text to embed
+            aembed_fn: Coroutine function mapping a list of texts to a list of vectors
+                       (defaults to ``openai_service.aget_embeddings``)
+        """
+        if aembed_fn is None:
+            from .openai_service import aget_embeddings
+            aembed_fn = aget_embeddings
+        self.text = text
+        self.aembed_fn = aembed_fn
+        self._vector = None
+
+    async def aget_vector(self) -> List[float]:
+        """Embedding of the query text, computed on the first call."""
+        if self._vector is None:
+            self._vector = (await self.aembed_fn([self.text]))[0]
+        return self._vector
@@ -0,0 +1,361 @@
+from typing import Optional, Dict, Any, List, Tuple
+import hashlib
+import heapq
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from app.services.serialization import encode, decode
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Lookup result: (cached result, cosine similarity)
+CacheHit = Tuple[Dict[Any, Any], float]
+
+
+# Atomic insert + eviction. Drops accounting for entries whose TTL has passed,
+# writes the entry, then pops the lowest-scored entries (oldest access for LRU,
+# fewest hits for LFU) until the entry count and byte budget fit. Evictions are
+# appended to the log so every worker drops the row from its local index.
+_INSERT_SCRIPT = """
+local entry_key, log_key, usage_key, expiry_key, sizes_key, bytes_key, evictions_key =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7]
+local entry_id, ttl, expires_at, score, size = ARGV[1], ARGV[5], ARGV[6], ARGV[7], tonumber(ARGV[8])
+local max_log, max_entries, max_bytes, now, prefix = ARGV[9], tonumber(ARGV[10]), tonumber(ARGV[11]), ARGV[12], ARGV[13]
+local keep_usage = ARGV[14] == '1'
+
+local function forget(id)
+    local old_size = tonumber(redis.call('HGET', sizes_key, id) or '0')
+    redis.call('HDEL', sizes_key, id)
+    redis.call('ZREM', usage_key, id)
+    redis.call('ZREM', expiry_key, id)
+    return redis.call('DECRBY', bytes_key, old_size)
+end
+
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', expiry_key, '-inf', now)) do
+    forget(id)
+end
+
+-- Re-inserting a live entry keeps its hit count (and, under LFU, its frequency score)
+local hits = redis.call('HGET', entry_key, 'hits') or 0
+if keep_usage then
+    score = redis.call('ZSCORE', usage_key, entry_id) or score
+end
+forget(entry_id)
+redis.call('HSET', entry_key, 'query', ARGV[2], 'vector', ARGV[3], 'result', ARGV[4], 'hits', hits)
+redis.call('EXPIRE', entry_key, ttl)
+-- The log carries ids only; workers read the vector from the entry hash
+redis.call('XADD', log_key, 'MAXLEN', '~', max_log, '*', 'op', 'add', 'entry', entry_id, 'expires_at', expires_at)
+
+local total = tonumber(redis.call('GET', bytes_key) or '0')
+local evicted = 0
+while redis.call('ZCARD', usage_key) > 0
+      and (redis.call('ZCARD', usage_key) >= max_entries or total + size > max_bytes) do
+    local victim = redis.call('ZPOPMIN', usage_key)[1]
+    total = forget(victim)
+    redis.call('DEL', prefix .. victim)
+    redis.call('XADD', log_key, 'MAXLEN', '~', max_log, '*', 'op', 'del', 'entry', victim)
+    evicted = evicted + 1
+end
+if evicted > 0 then
+    redis.call('INCRBY', evictions_key, evicted)
+end
+
+redis.call('ZADD', usage_key, score, entry_id)
+redis.call('ZADD', expiry_key, expires_at, entry_id)
+redis.call('HSET', sizes_key, entry_id, size)
+redis.call('INCRBY', bytes_key, size)
+return evicted
+"""
+
+
+class RedisMatrixBackend:
+    """
+    Semantic cache index as a float32 matrix kept in each worker, fed from Redis.
+
+    Every cached query is its own Redis hash (query, float32 vector, result,
+    hit count) with its own TTL. Inserts run as one Lua script that also
+    appends the entry id to a Redis stream; each worker reads the stream from
+    the last id it has seen, fetches the vectors of the new entries from their
+    hashes and applies them to its local VectorIndex, so no worker ever
+    rewrites or reloads the whole index. The stream holds no vectors, so it
+    stays small next to the entries' byte budget. Lookups are an exact
+    scan (one matrix-vector product).
+
+    The cache is bounded by ``max_entries`` and ``max_bytes`` (query + vector +
+    encoded result per entry). When an insert would exceed either limit, entries
+    are evicted by the policy: "lru" (least recently hit or inserted) or "lfu"
+    (fewest hits).
+    """
+
+    ENTRY_PREFIX = "semantic_cache:entry:"    # hash per cached query: query, vector, result, hits
+    LOG_KEY = "semantic_cache:log"            # stream of inserts and evictions
+    USAGE_KEY = "semantic_cache:usage"        # zset entry id -> last access time (lru) or hits (lfu)
+    EXPIRY_KEY = "semantic_cache:expiry"      # zset entry id -> expires_at
+    SIZES_KEY = "semantic_cache:sizes"        # hash entry id -> bytes
+    BYTES_KEY = "semantic_cache:bytes"        # resident bytes of all entries
+    EVICTIONS_KEY = "semantic_cache:evictions"
+
+    EVICTION_POLICIES = ("lru", "lfu")
+
+    def __init__(self, cache, max_log_entries: int = 100000, max_entries: int = 10000,
+                 max_bytes: int = 256 * 1024 * 1024, eviction_policy: str = "lru"):
+        """
+        Args:
+            cache: CacheService whose binary client holds the entries
+            max_log_entries: Approximate cap on the insert stream (bounds worker bootstrap)
+            max_entries: Maximum number of cached queries
+            max_bytes: Budget for the stored queries, vectors and results
+            eviction_policy: "lru" or "lfu"
+        """
+        if eviction_policy not in self.EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{eviction_policy}', expected one of {self.EVICTION_POLICIES}")
+        self.cache = cache
+        self.max_log_entries = max_log_entries
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.index = VectorIndex()
+        self._expires_at: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._last_log_id = None
+        self._insert_script = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache.enabled
+
+    @staticmethod
+    def entry_id(query: str) -> str:
+        """Stable id per query, so re-caching a query replaces its entry."""
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()[:32]
+
+    def _add_local(self, entry_id: str, vector: np.ndarray, expires_at: float):
+        self.index.add(entry_id, vector)
+        self._expires_at[entry_id] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, entry_id))
+
+    def _remove_local(self, entry_id: str):
+        self.index.remove(entry_id)
+        self._expires_at.pop(entry_id, None)
+
+    def _drop_expired(self, now: float):
+        """Remove rows whose TTL has passed (lazy heap; stale heap items are skipped)."""
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, entry_id = heapq.heappop(self._expiry_heap)
+            if self._expires_at.get(entry_id) == expires_at:
+                self._remove_local(entry_id)
+
+    def _sync(self):
+        """Apply inserts and evictions from other workers that this worker hasn't seen yet."""
+        redis = self.cache.raw_redis
+        while True:
+            start = f"({self._last_log_id}" if self._last_log_id else "-"
+            records = redis.xrange(self.LOG_KEY, min=start, max="+", count=1000)
+            # Vectors of the added entries, fetched in one round trip
+            pipe = redis.pipeline(transaction=False)
+            for _, fields in records:
+                if fields.get(b"op") != b"del":
+                    pipe.hget(f"{self.ENTRY_PREFIX}{fields[b'entry'].decode()}", "vector")
+            vectors = iter(pipe.execute())
+            for record_id, fields in records:
+                self._last_log_id = record_id.decode()
+                entry_id = fields[b"entry"].decode()
+                if fields.get(b"op") == b"del":
+                    self._remove_local(entry_id)
+                    continue
+                vector = next(vectors)
+                if vector is None:
+                    # Evicted or expired since it was logged
+                    continue
+                self._add_local(entry_id, np.frombuffer(vector, dtype=np.float32), float(fields[b"expires_at"]))
+            if len(records) < 1000:
+                break
+        self._drop_expired(time.time())
+
+    def _touch(self, entry_id: str):
+        """Count a hit and refresh the entry's eviction score."""
+        pipe = self.cache.raw_redis.pipeline(transaction=False)
+        pipe.hincrby(f"{self.ENTRY_PREFIX}{entry_id}", "hits", 1)
+        if self.eviction_policy == "lfu":
+            pipe.zadd(self.USAGE_KEY, {entry_id: 1}, xx=True, incr=True)
+        else:
+            pipe.zadd(self.USAGE_KEY, {entry_id: time.time()}, xx=True)
+        pipe.execute()
+
+    def lookup(self, query_embedding: List[float], threshold: float) -> Optional[CacheHit]:
+        """Most similar cached query at or above the threshold, with its result."""
+        with self._lock:
+            self._sync()
+            best_match, best_similarity = self.index.search(query_embedding)
+
+        if best_match and best_similarity >= threshold:
+            cached_result = self.cache.raw_redis.hget(f"{self.ENTRY_PREFIX}{best_match}", "result")
+            if cached_result:
+                self._touch(best_match)
+                return decode(cached_result), best_similarity
+            # Entry is gone from Redis (expired or evicted): forget it here too
+            with self._lock:
+                self._remove_local(best_match)
+        return None
+
+    def insert(self, query: str, query_embedding: List[float], result: Dict[Any, Any], ttl: int):
+        """Store the entry, log it and evict over-budget entries in one atomic script."""
+        entry_id = self.entry_id(query)
+        vector = VectorIndex.normalize(query_embedding).tobytes()
+        serialized = encode(result, compress=self.cache.compress)
+        now = time.time()
+        size = len(query.encode("utf-8")) + len(vector) + len(serialized)
+
+        if self._insert_script is None:
+            self._insert_script = self.cache.raw_redis.register_script(_INSERT_SCRIPT)
+        evicted = self._insert_script(
+            keys=[f"{self.ENTRY_PREFIX}{entry_id}", self.LOG_KEY, self.USAGE_KEY, self.EXPIRY_KEY,
+                  self.SIZES_KEY, self.BYTES_KEY, self.EVICTIONS_KEY],
+            args=[entry_id, query, vector, serialized, ttl, now + ttl,
+                  0 if self.eviction_policy == "lfu" else now, size,
+                  self.max_log_entries, self.max_entries, self.max_bytes, now, self.ENTRY_PREFIX,
+                  1 if self.eviction_policy == "lfu" else 0]
+        )
+        if evicted:
+            logger.info(f"Semantic cache evicted {evicted} entries ({self.eviction_policy})")
+
+        with self._lock:
+            self._sync()
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident entries and bytes in Redis, eviction count and configured limits."""
+        pipe = self.cache.raw_redis.pipeline(transaction=False)
+        pipe.zcard(self.USAGE_KEY)
+        pipe.get(self.BYTES_KEY)
+        pipe.get(self.EVICTIONS_KEY)
+        entries, resident_bytes, evictions = pipe.execute()
+        return {
+            "backend": "redis",
+            "eviction_policy": self.eviction_policy,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "resident_bytes": int(resident_bytes or 0),
+            "max_bytes": self.max_bytes,
+            "evictions": int(evictions or 0),
+            "local_index_rows": len(self.index),
+        }
+
+
+class QdrantCacheBackend:
+    """
+    Semantic cache index in a dedicated Qdrant collection (HNSW, sub-linear lookup).
+
+    Each cached query is one point whose payload holds the query, the result and
+    an ``expires_at`` timestamp. Lookups filter out expired points and expired
+    points are deleted periodically, which gives per-entry TTL.
+    """
+
+    def __init__(self, client, collection_name: str = "semantic_cache", purge_interval: float = 60.0):
+        """
+        Args:
+            client: QdrantClient (``QdrantClient(":memory:")`` works for tests)
+            collection_name: Collection used only for cached queries
+            purge_interval: Minimum seconds between deletions of expired points
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.purge_interval = purge_interval
+        self._initialized = False
+        self._last_purge = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    def _ensure_collection_exists(self, vector_size: int):
+        """Create the collection and the expires_at payload index on first use."""
+        if self._initialized:
+            return
+        from qdrant_client.models import VectorParams, Distance, PayloadSchemaType
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+            )
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="expires_at",
+                field_schema=PayloadSchemaType.FLOAT,
+            )
+            logger.info(f"Semantic cache collection '{self.collection_name}' created")
+        self._initialized = True
+
+    def _not_expired(self, now: float):
+        from qdrant_client.models import Filter, FieldCondition, Range
+        return Filter(must=[FieldCondition(key="expires_at", range=Range(gt=now))])
+
+    def purge_expired(self, now: Optional[float] = None):
+        """Delete points whose TTL has passed."""
+        from qdrant_client.models import Filter, FieldCondition, Range, FilterSelector
+        now = now or time.time()
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(must=[FieldCondition(key="expires_at", range=Range(lte=now))])
+            ),
+        )
+        self._last_purge = now
+
+    def lookup(self, query_embedding: List[float], threshold: float) -> Optional[CacheHit]:
+        """Nearest unexpired cached query at or above the threshold (score_threshold is applied server-side)."""
+        self._ensure_collection_exists(len(query_embedding))
+        hits = self.client.query_points(
+            collection_name=self.collection_name,
+            query=list(query_embedding),
+            query_filter=self._not_expired(time.time()),
+            score_threshold=threshold,
+            limit=1,
+            with_payload=True,
+        ).points
+        if not hits:
+            return None
+        return hits[0].payload["result"], hits[0].score
+
+    def insert(self, query: str, query_embedding: List[float], result: Dict[Any, Any], ttl: int):
+        """Upsert the query as a point (same query -> same point id) with its own expiry."""
+        from qdrant_client.models import PointStruct
+        self._ensure_collection_exists(len(query_embedding))
+        now = time.time()
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[PointStruct(
+                id=str(uuid.uuid5(uuid.NAMESPACE_URL, query)),
+                vector=list(query_embedding),
+                payload={"query": query, "result": result, "created_at": now, "expires_at": now + ttl},
+            )],
+        )
+        if now - self._last_purge >= self.purge_interval:
+            self.purge_expired(now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of points in the cache collection (expired points count until purged)."""
+        if not self._initialized:
+            return {"backend": "qdrant", "entries": 0}
+        entries = self.client.count(self.collection_name).count
+        return {"backend": "qdrant", "entries": entries}
+
+
+# Example usage (for testing only, against the in-memory Qdrant client):
+if __name__ == "__main__":
+    from qdrant_client import QdrantClient
+
+    backend = QdrantCacheBackend(QdrantClient(":memory:"), purge_interval=0)
+    backend.insert("what is solar power", [1.0, 0.0, 0.0], {"results": ["solar"]}, ttl=600)
+    backend.insert("how to recycle phones", [0.0, 1.0, 0.0], {"results": ["recycle"]}, ttl=600)
+    backend.insert("old query", [0.0, 0.0, 1.0], {"results": ["old"]}, ttl=-1)
+
+    assert backend.lookup([0.98, 0.1, 0.0], threshold=0.9)[0] == {"results": ["solar"]}
+    assert backend.lookup([0.5, 0.5, 0.5], threshold=0.9) is None
+    assert backend.lookup([0.0, 0.0, 1.0], threshold=0.9) is None  # expired
+    print(f"Points after purge: {backend.client.count(backend.collection_name).count}")
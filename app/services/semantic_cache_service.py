@@ -1,113 +1,253 @@
-from typing import Optional, Dict, Any
-import numpy as np
+from typing import Optional, Dict, Any, List, Union
+import asyncio
+import hashlib
+import json
+import os
 from app.services.cache_service import cache
-from app.services.openai_service import get_embeddings
+from app.services.corpus_version import corpus_version as shared_corpus_version
+from app.services.semantic_cache_backends import RedisMatrixBackend, QdrantCacheBackend
 
 
 class SemanticCacheService:
     """
-    Lightweight semantic cache using OpenAI embeddings and Redis.
+    Lightweight semantic cache using OpenAI embeddings.
     Caches search results and uses cosine similarity to find similar queries.
+
+    The index of cached queries is pluggable: an exact float32 matrix shared
+    through Redis (default) or a dedicated Qdrant collection for large query
+    populations (sub-linear HNSW lookup).
+
+    Each entry records the corpus generation it was computed at; entries from
+    an older generation are treated as misses, so an upload or delete makes
+    every earlier result stale immediately. Entries also record the search
+    parameters that shaped the result (limit, fusion, ...), and a similar
+    query only hits when they are the same.
+
+    In front of the semantic tier sits an exact tier: a plain Redis key built
+    from the normalized query, the search parameters and the corpus
+    generation. Repeated queries are answered from it in O(1), without an
+    embedding call or index scan.
     """
-    
-    def __init__(self, similarity_threshold: float = 0.85):
+
+    EXACT_PREFIX = "search_cache:exact:"
+
+    def __init__(self, similarity_threshold: float = 0.85, backend=None, corpus_version=None,
+                 exact_cache=None):
         """
         Initialize semantic cache.
-        
+
         Args:
             similarity_threshold: Minimum cosine similarity for cache hit (0-1)
                                  0.90 = very similar, 0.85 = somewhat similar
+            backend: Index backend (defaults to RedisMatrixBackend on the shared cache)
+            corpus_version: CorpusVersion the entries are checked against (defaults to the shared one)
+            exact_cache: CacheService holding the exact tier (defaults to the shared cache)
         """
         self.similarity_threshold = similarity_threshold
-        self.cache = cache
-    
-    def _cosine_similarity(self, vec1, vec2) -> float:
-        """Calculate cosine similarity between two vectors."""
-        vec1_np = np.array(vec1)
-        vec2_np = np.array(vec2)
-        
-        dot_product = np.dot(vec1_np, vec2_np)
-        norm1 = np.linalg.norm(vec1_np)
-        norm2 = np.linalg.norm(vec2_np)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return float(dot_product / (norm1 * norm2))
-    
-    def get(self, query: str) -> Optional[Dict[Any, Any]]:
+        self.backend = backend or RedisMatrixBackend(cache)
+        self.corpus_version = corpus_version or shared_corpus_version
+        self.exact_cache = exact_cache or cache
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend.enabled
+
+    def exact_key(self, query: Union[str, Dict[str, str]], params: Dict[str, Any], generation: int) -> str:
+        """
+        Exact-tier key for a query.
+
+        Args:
+            query: Query exactly as the search runs it; when the legs search different
+                   strings (e.g. cleaned for dense, raw for BM25) pass them all, keyed by leg
+            params: Search parameters that change the result (limit, fusion, weights, ...)
+            generation: Corpus generation, so uploads and deletes change every key
+        """
+        payload = json.dumps({"query": query, "params": params, "generation": generation}, sort_keys=True)
+        return f"{self.EXACT_PREFIX}{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get_exact(self, key: str) -> Optional[Dict[Any, Any]]:
+        """Cached result stored under an exact-tier key, or None."""
+        result = self.exact_cache.get(key)
+        if result is None:
+            self.exact_misses += 1
+        else:
+            self.exact_hits += 1
+        return result
+
+    async def aget_exact(self, key: str) -> Optional[Dict[Any, Any]]:
+        """Async variant of get_exact."""
+        result = await self.exact_cache.aget(key)
+        if result is None:
+            self.exact_misses += 1
+        else:
+            self.exact_hits += 1
+        return result
+
+    async def aset_exact(self, key: str, result: Dict[Any, Any], ttl: int = 600):
+        """Store a result in the exact tier only (e.g. for searches the semantic tier can't tell apart)."""
+        await self.exact_cache.aset(key, result, ttl)
+
+    @staticmethod
+    def _params_fingerprint(params: Optional[Dict[str, Any]]) -> Optional[str]:
+        return json.dumps(params, sort_keys=True) if params is not None else None
+
+    def get(self, query: str, query_embedding: Optional[List[float]] = None,
+            generation: Optional[int] = None, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[Any, Any]]:
         """
         Get cached result for semantically similar query.
-        
+
+        Args:
+            query: The search query
+            query_embedding: Precomputed embedding of the query (skips the embedding call)
+            generation: Corpus generation the result must belong to (defaults to the current one)
+            params: Search parameters the result must have been computed with (as passed to ``set``)
+
         Returns:
             Cached results if similar query found, None otherwise
         """
-        if not self.cache.enabled:
+        if not self.enabled:
             return None
-        
+
         try:
             # Generate embedding for the query
-            query_embedding = get_embeddings([query])[0]
-            
-            # Get the index of all cached queries
-            cache_index = self.cache.get("semantic_cache:index")
-            
-            if not cache_index:
-                return None
-            
-            # Find most similar query
-            best_match = None
-            best_similarity = 0.0
-            
-            for cached_query, cached_embedding in cache_index.items():
-                similarity = self._cosine_similarity(query_embedding, cached_embedding)
-                
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = cached_query
-            
-            # Check if similarity is above threshold
-            if best_match and best_similarity >= self.similarity_threshold:
-                # Get the actual cached result
-                cached_result = self.cache.get(f"semantic_cache:result:{best_match}")
-                
-                if cached_result:
-                    # Add similarity score to cached result
-                    cached_result['cache_similarity'] = round(best_similarity, 3)
-                    return cached_result
-            
+            if query_embedding is None:
+                from app.services.openai_service import get_embeddings
+                query_embedding = get_embeddings([query])[0]
+            if generation is None:
+                generation = self.corpus_version.current()
+
+            hit = self.backend.lookup(query_embedding, self.similarity_threshold)
+            # Results computed before the last upload/delete, or with other parameters, don't match
+            if (hit and hit[0].pop('corpus_generation', None) == generation
+                    and hit[0].pop('cache_params', None) == self._params_fingerprint(params)):
+                cached_result, similarity = hit
+                # Add similarity score to cached result
+                cached_result['cache_similarity'] = round(similarity, 3)
+                self.hits += 1
+                return cached_result
+            self.misses += 1
+
         except Exception as e:
             print(f"[SEMANTIC CACHE ERROR] {e}")
-        
+
         return None
-    
-    def set(self, query: str, result: Dict[Any, Any], ttl: int = 600):
+
+    def set(self, query: str, result: Dict[Any, Any], ttl: int = 600,
+            query_embedding: Optional[List[float]] = None, generation: Optional[int] = None,
+            exact_key: Optional[str] = None, params: Optional[Dict[str, Any]] = None):
         """
         Cache result with query embedding.
-        
+
         Args:
             query: The search query
             result: The search result to cache
             ttl: Time to live in seconds
+            query_embedding: Precomputed embedding of the query (skips the embedding call)
+            generation: Corpus generation the result was computed at; pass the value read
+                        before searching so a concurrent upload isn't masked (defaults to current)
+            exact_key: Also store the result under this exact-tier key (see ``exact_key``)
+            params: Search parameters that shaped the result; ``get`` only returns it for the same ones
         """
-        if not self.cache.enabled:
+        if exact_key:
+            self.exact_cache.set(exact_key, result, ttl)
+        if not self.enabled:
             return
-        
+
         try:
             # Generate embedding
-            query_embedding = get_embeddings([query])[0]
-            
-            # Update the cache index
-            cache_index = self.cache.get("semantic_cache:index") or {}
-            cache_index[query] = query_embedding
-            self.cache.set("semantic_cache:index", cache_index, ttl=ttl)
-            
-            # Cache the actual result
-            self.cache.set(f"semantic_cache:result:{query}", result, ttl=ttl)
-            
+            if query_embedding is None:
+                from app.services.openai_service import get_embeddings
+                query_embedding = get_embeddings([query])[0]
+            if generation is None:
+                generation = self.corpus_version.current()
+
+            self.backend.insert(query, query_embedding, {
+                **result,
+                'corpus_generation': generation,
+                'cache_params': self._params_fingerprint(params)
+            }, ttl)
+
         except Exception as e:
             print(f"[SEMANTIC CACHE ERROR] {e}")
 
+    async def aget(self, query: str, query_embedding: Optional[List[float]] = None,
+                   generation: Optional[int] = None, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[Any, Any]]:
+        """Async variant of get; the index lookup runs off the event loop."""
+        if not self.enabled:
+            return None
+
+        if query_embedding is None:
+            from app.services.openai_service import aget_embeddings
+            query_embedding = (await aget_embeddings([query]))[0]
+        if generation is None:
+            generation = await self.corpus_version.acurrent()
+        return await asyncio.to_thread(self.get, query, query_embedding, generation, params)
+
+    async def aset(self, query: str, result: Dict[Any, Any], ttl: int = 600,
+                   query_embedding: Optional[List[float]] = None, generation: Optional[int] = None,
+                   exact_key: Optional[str] = None, params: Optional[Dict[str, Any]] = None):
+        """Async variant of set; the index update runs off the event loop."""
+        if exact_key:
+            await self.exact_cache.aset(exact_key, result, ttl)
+        if not self.enabled:
+            return
+
+        if query_embedding is None:
+            from app.services.openai_service import aget_embeddings
+            query_embedding = (await aget_embeddings([query]))[0]
+        if generation is None:
+            generation = await self.corpus_version.acurrent()
+        await asyncio.to_thread(self.set, query, result, ttl, query_embedding, generation, None, params)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per-tier hit/miss counters of this worker, plus the semantic backend's size and eviction metrics.
+
+        The semantic tier only sees exact-tier misses, so its hit rate is relative to those.
+        """
+        def tier(hits: int, misses: int) -> Dict[str, Any]:
+            lookups = hits + misses
+            return {"hits": hits, "misses": misses, "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+
+        exact_lookups = self.exact_hits + self.exact_misses
+        stats = {
+            "exact": tier(self.exact_hits, self.exact_misses),
+            "semantic": tier(self.hits, self.misses),
+            "overall_hit_rate": round((self.exact_hits + self.hits) / exact_lookups, 3) if exact_lookups else 0.0,
+        }
+        if self.enabled:
+            try:
+                stats["semantic"].update(self.backend.stats())
+            except Exception as e:
+                print(f"[SEMANTIC CACHE ERROR] {e}")
+        return stats
+
+
+def _default_backend():
+    """
+    Backend selected by SEMANTIC_CACHE_BACKEND: "redis" (default) or "qdrant".
+
+    The Redis backend is bounded by SEMANTIC_CACHE_MAX_ENTRIES and
+    SEMANTIC_CACHE_MAX_BYTES and evicts by SEMANTIC_CACHE_EVICTION ("lru"/"lfu").
+    """
+    if os.getenv("SEMANTIC_CACHE_BACKEND", "redis").lower() == "qdrant":
+        from qdrant_client import QdrantClient
+        from app.config import settings
+        return QdrantCacheBackend(
+            QdrantClient(settings.qdrant_url),
+            collection_name=os.getenv("SEMANTIC_CACHE_COLLECTION", "semantic_cache")
+        )
+    return RedisMatrixBackend(
+        cache,
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+        max_bytes=int(os.getenv("SEMANTIC_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        eviction_policy=os.getenv("SEMANTIC_CACHE_EVICTION", "lru").lower()
+    )
+
 
 # Global semantic cache instance with 0.90 similarity threshold
-semantic_cache = SemanticCacheService(similarity_threshold=0.90)
\ No newline at end of file
+semantic_cache = SemanticCacheService(similarity_threshold=0.90, backend=_default_backend())
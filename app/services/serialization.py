@@ -0,0 +1,111 @@
+from typing import Any, List
+import json
+
+import numpy as np
+
+# Optional fast codecs; plain json is used when none is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# First byte of every encoded value: format id, plus COMPRESSED when the body is zstd-compressed.
+# Values written before this header existed are plain JSON text (first byte >= 0x20).
+FLOAT32 = 0x01
+JSON = 0x02
+ORJSON = 0x03
+MSGPACK = 0x04
+COMPRESSED = 0x80
+
+PAYLOAD_FORMATS = {"json": JSON, "orjson": ORJSON, "msgpack": MSGPACK}
+
+
+def default_payload_format() -> str:
+    """Fastest installed payload codec: orjson, then msgpack, then json."""
+    if orjson is not None:
+        return "orjson"
+    if msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+def _pack(fmt: int, body: bytes, compress: bool) -> bytes:
+    if compress and zstandard is not None:
+        return bytes([fmt | COMPRESSED]) + zstandard.ZstdCompressor(level=3).compress(body)
+    return bytes([fmt]) + body
+
+
+def encode_vector(vector, compress: bool = False) -> bytes:
+    """Vector as raw float32 bytes (6 KB for 1536 dimensions instead of ~30 KB of JSON text)."""
+    return _pack(FLOAT32, np.asarray(vector, dtype=np.float32).tobytes(), compress)
+
+
+def encode(value: Any, payload_format: str = None, compress: bool = False) -> bytes:
+    """
+    Encode a JSON-compatible value.
+
+    Args:
+        value: Data to encode
+        payload_format: "orjson", "msgpack" or "json" (defaults to the fastest installed)
+        compress: zstd-compress the body (ignored when zstandard is not installed)
+    """
+    payload_format = payload_format or default_payload_format()
+    if payload_format == "orjson" and orjson is not None:
+        return _pack(ORJSON, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY), compress)
+    if payload_format == "msgpack" and msgpack is not None:
+        return _pack(MSGPACK, msgpack.packb(value, use_bin_type=True), compress)
+    return _pack(JSON, json.dumps(value).encode("utf-8"), compress)
+
+
+def decode(data: bytes) -> Any:
+    """Decode a value written by ``encode`` or ``encode_vector`` (or legacy JSON text)."""
+    header = data[0]
+    if header >= 0x20 and not header & COMPRESSED:
+        return json.loads(data)
+    body = data[1:]
+    if header & COMPRESSED:
+        if zstandard is None:
+            raise ValueError("Value is zstd-compressed but zstandard is not installed")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    fmt = header & ~COMPRESSED
+    if fmt == FLOAT32:
+        return decode_vector(body)
+    if fmt == ORJSON:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    if fmt == MSGPACK:
+        if msgpack is None:
+            raise ValueError("Value is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False)
+    if fmt == JSON:
+        return json.loads(body)
+    raise ValueError(f"Unknown cache value format {fmt:#x}")
+
+
+def decode_vector(body: bytes) -> List[float]:
+    """Raw float32 bytes back to a list of floats."""
+    return np.frombuffer(body, dtype=np.float32).tolist()
+
+
+# Example usage (for testing only):
+if __name__ == "__main__":
+    vector = np.random.default_rng(0).standard_normal(1536).astype(np.float32).tolist()
+    result = {"query": "solar power", "results": [{"content": "Solar panels ...", "score": 0.91}] * 5}
+
+    assert decode(encode_vector(vector)) == vector
+    assert decode(encode_vector(vector, compress=True)) == vector
+    for payload_format in PAYLOAD_FORMATS:
+        assert decode(encode(result, payload_format)) == result
+        assert decode(encode(result, payload_format, compress=True)) == result
+    assert decode(json.dumps(result).encode("utf-8")) == result  # legacy values
+    print(f"vector: {len(encode_vector(vector))} bytes (json {len(json.dumps(vector))}), "
+          f"result: {len(encode(result))} bytes with {default_payload_format()}")
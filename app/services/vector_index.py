@@ -0,0 +1,104 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+
+class VectorIndex:
+    """
+    In-memory exact cosine index.
+
+    Vectors are L2-normalized on insert and kept as rows of one contiguous
+    float32 matrix, so a lookup is a single matrix-vector product plus argmax.
+    """
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 256):
+        """
+        Args:
+            dim: Vector size (inferred from the first vector when None)
+            initial_capacity: Rows allocated up front; capacity doubles when full
+        """
+        self.dim = dim
+        self._matrix = np.zeros((initial_capacity, dim or 0), dtype=np.float32)
+        self._keys: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    @property
+    def keys(self) -> List[Hashable]:
+        """Keys in row order."""
+        return list(self._keys)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the occupied rows (normalized float32 vectors)."""
+        return self._matrix[:len(self._keys)]
+
+    @staticmethod
+    def normalize(vector) -> np.ndarray:
+        """Return the vector as a unit-length float32 array (zero vectors stay zero)."""
+        array = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _ensure_capacity(self, rows: int):
+        if self.dim is None:
+            raise ValueError("Vector size is unknown until the first vector is added")
+        if self._matrix.shape[1] != self.dim:
+            self._matrix = np.zeros((max(self._matrix.shape[0], 1), self.dim), dtype=np.float32)
+        if rows > self._matrix.shape[0]:
+            capacity = max(rows, self._matrix.shape[0] * 2)
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:len(self._keys)] = self.matrix
+            self._matrix = grown
+
+    def add(self, key: Hashable, vector):
+        """Insert a vector, replacing any existing vector with the same key."""
+        normalized = self.normalize(vector)
+        if self.dim is None:
+            self.dim = normalized.shape[0]
+        if normalized.shape[0] != self.dim:
+            raise ValueError(f"Expected a vector of size {self.dim}, got {normalized.shape[0]}")
+
+        row = self._rows.get(key)
+        if row is None:
+            self._ensure_capacity(len(self._keys) + 1)
+            row = len(self._keys)
+            self._keys.append(key)
+            self._rows[key] = row
+        self._matrix[row] = normalized
+
+    def remove(self, key: Hashable) -> bool:
+        """Remove a key in O(1) by moving the last row into its slot."""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        last = len(self._keys) - 1
+        if row != last:
+            last_key = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._keys[row] = last_key
+            self._rows[last_key] = row
+        self._keys.pop()
+        return True
+
+    def clear(self):
+        """Remove all vectors (keeps the allocated capacity)."""
+        self._keys = []
+        self._rows = {}
+
+    def search(self, vector) -> Tuple[Optional[Hashable], float]:
+        """
+        Find the most similar stored vector.
+
+        Returns:
+            (key, cosine similarity), or (None, 0.0) when the index is empty
+        """
+        if not self._keys:
+            return None, 0.0
+        similarities = self.matrix @ self.normalize(vector)
+        best = int(np.argmax(similarities))
+        return self._keys[best], float(similarities[best])
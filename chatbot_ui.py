@@ -3,6 +3,7 @@ import requests
 from openai import OpenAI
 from app.config import settings
 from app.services.conversation_memory import ConversationMemory
+import time
 import uuid
 
 
@@ -10,6 +11,8 @@ import uuid
 OPENAI_API_KEY = settings.openai_api_key
 FASTAPI_URL = settings.fastapi_url
 SECRET_TOKEN = settings.secret_key
+# Longest wait for a background ingestion job before the UI gives up polling
+UPLOAD_POLL_TIMEOUT = 300
 
 # Initialize OpenAI client
 client = OpenAI(api_key=OPENAI_API_KEY)
@@ -44,7 +47,7 @@ if st.sidebar.button("🗑️ Clear Conversation"):
 st.sidebar.markdown("### 📄 Upload")
 uploaded_file = st.sidebar.file_uploader("Upload .txt or .md", type=["txt", "md"])
 if uploaded_file and st.sidebar.button("Upload"):
-    with st.spinner("Uploading..."):
+    with st.spinner("Uploading and processing..."):
         try:
             files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
             response = requests.post(
@@ -52,9 +55,38 @@ if uploaded_file and st.sidebar.button("Upload"):
                 files=files,
                 headers={"x-token": SECRET_TOKEN}
             )
-            if response.status_code == 200:
+            if response.status_code == 202:
                 result = response.json()
-                st.sidebar.success(f"✅ {result['chunks_created']} chunks created")
+                if result.get('replaces_existing'):
+                    st.sidebar.warning(f"⚠️ Replacing the stored {uploaded_file.name}")
+                # Ingestion runs in the background: poll the job until it finishes, up to a deadline
+                job = result
+                deadline = time.monotonic() + UPLOAD_POLL_TIMEOUT
+                poll_error = None
+                while job['status'] not in ("completed", "failed"):
+                    if time.monotonic() >= deadline:
+                        poll_error = f"still {job['status']} after {UPLOAD_POLL_TIMEOUT}s"
+                        break
+                    time.sleep(1)
+                    job_response = requests.get(
+                        f"{FASTAPI_URL}/documents/jobs/{result['job_id']}",
+                        headers={"x-token": SECRET_TOKEN},
+                        timeout=10
+                    )
+                    if job_response.status_code != 200:
+                        # e.g. 404: the job is unknown to the server (restarted, or trimmed)
+                        poll_error = f"job status unavailable (HTTP {job_response.status_code})"
+                        break
+                    job = job_response.json()
+                if poll_error:
+                    st.sidebar.error(f"Lost track of the upload: {poll_error}. Check 📋 Documents later.")
+                elif job['status'] == "completed":
+                    chunks = job['chunks']
+                    st.sidebar.success(f"✅ {chunks['chunks']} chunks ({chunks['embedded']} embedded)")
+                else:
+                    st.sidebar.error(f"Upload failed: {job.get('error')}")
+            elif response.status_code == 503:
+                st.sidebar.error("Ingestion queue is full, try again shortly")
             else:
                 st.sidebar.error("Upload failed")
         except Exception as e:
@@ -0,0 +1,118 @@
+"""
+Cache value encodings: encode/decode time and stored size.
+
+Compares JSON text (the previous format) with the binary encodings used by
+CacheService: raw float32 for embeddings, orjson/msgpack for search results,
+each optionally zstd-compressed. Codecs that aren't installed are skipped.
+With --redis, each value is also written to Redis on localhost:6379 and its
+memory is read with MEMORY USAGE.
+
+Usage:
+    python scripts/benchmark_cache_serialization.py --dims 1536 --results 10
+    python scripts/benchmark_cache_serialization.py --redis
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import serialization
+from app.services.serialization import encode, encode_vector, decode
+
+
+def time_us(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(latencies)
+
+
+def sample_result(n_results):
+    rng = np.random.default_rng(1)
+    return {
+        "query": "how do solar panels convert sunlight into electricity",
+        "cleaned_query": "how do solar panels convert sunlight into electricity",
+        "intent": "informational",
+        "source": "hybrid",
+        "results": [
+            {
+                "content": " ".join(["Photovoltaic cells absorb photons and release electrons."] * 8),
+                "title": f"solar_{i}.md",
+                "document_id": f"3f2b8c1e-0000-4000-8000-{i:012d}",
+                "chunk_index": i,
+                "qdrant_score": float(rng.random()),
+                "es_score": float(rng.random() * 10),
+                "combined_score": float(rng.random()),
+            }
+            for i in range(n_results)
+        ],
+    }
+
+
+def encodings(vector, result):
+    """(label, value, encode function) for every available encoding."""
+    rows = [
+        ("embedding json", vector, lambda: json.dumps(vector).encode("utf-8")),
+        ("embedding float32", vector, lambda: encode_vector(vector)),
+    ]
+    if serialization.zstandard is not None:
+        rows.append(("embedding float32+zstd", vector, lambda: encode_vector(vector, compress=True)))
+    rows.append(("result json", result, lambda: encode(result, "json")))
+    for payload_format, module in (("orjson", serialization.orjson), ("msgpack", serialization.msgpack)):
+        if module is not None:
+            rows.append((f"result {payload_format}", result, lambda f=payload_format: encode(result, f)))
+    if serialization.zstandard is not None:
+        rows.append(("result json+zstd", result, lambda: encode(result, "json", compress=True)))
+        best = serialization.default_payload_format()
+        if best != "json":
+            rows.append((f"result {best}+zstd", result, lambda: encode(result, best, compress=True)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache value encodings")
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--results", type=int, default=10, help="Results in the sample search response")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--redis", action="store_true", help="Also measure MEMORY USAGE in Redis on localhost:6379")
+    args = parser.parse_args()
+
+    vector = np.random.default_rng(0).standard_normal(args.dims).astype(np.float32).tolist()
+    result = sample_result(args.results)
+
+    redis_client = None
+    if args.redis:
+        from app.services.cache_service import CacheService
+        cache = CacheService()
+        if not cache.enabled:
+            sys.exit("Redis is not reachable on localhost:6379")
+        redis_client = cache.raw_redis
+
+    missing = [name for name in ("orjson", "msgpack", "zstandard") if getattr(serialization, name) is None]
+    if missing:
+        print(f"Not installed (skipped): {', '.join(missing)}")
+    print(f"{'encoding':<26}{'bytes':>9}{'encode us':>12}{'decode us':>12}{'redis bytes':>13}")
+    for label, value, encode_fn in encodings(vector, result):
+        data = encode_fn()
+        assert decode(data) == value
+        encode_us = time_us(encode_fn, args.repeats)
+        decode_us = time_us(lambda: decode(data), args.repeats)
+        memory = "-"
+        if redis_client is not None:
+            key = f"benchmark:serialization:{label}"
+            redis_client.set(key, data)
+            memory = redis_client.memory_usage(key)
+            redis_client.delete(key)
+        print(f"{label:<26}{len(data):>9}{encode_us:>12.1f}{decode_us:>12.1f}{memory:>13}")
+
+
+if __name__ == "__main__":
+    main()
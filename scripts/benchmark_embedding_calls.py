@@ -0,0 +1,76 @@
+"""
+Count embedding API calls per upload: per-store embedding vs the shared IngestionPipeline.
+
+Runs offline against the sample files in data/ with a counting fake embedder,
+so no OpenAI key, Qdrant or Elasticsearch is needed.
+
+Usage:
+    python scripts/benchmark_embedding_calls.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.document_loader.loader import load_text_file
+from app.document_loader.chunker import chunk_document
+from app.services.ingestion_pipeline import IngestionPipeline
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+BATCH_SIZE = 100
+
+
+class CountingEmbedder:
+    """Fake embedding client that counts requests and embedded texts."""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.calls = 0
+        self.texts = 0
+
+    def __call__(self, texts):
+        # One API request per batch, like get_embeddings
+        self.calls += (len(texts) + self.batch_size - 1) // self.batch_size
+        self.texts += len(texts)
+        return [[0.0] * 8 for _ in texts]
+
+
+class SelfEmbeddingStore:
+    """Old behaviour: every store embeds the chunks it receives."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+
+    def store_document_chunks(self, document_id, chunks, title="Untitled", embeddings=None, start_index=0):
+        if embeddings is None:
+            embeddings = self.embedder(chunks)
+        return len(chunks)
+
+
+def run(chunks, shared):
+    embedder = CountingEmbedder()
+    stores = [SelfEmbeddingStore(embedder), SelfEmbeddingStore(embedder)]  # Qdrant + Elasticsearch
+    if shared:
+        IngestionPipeline(stores, embed_fn=embedder, batch_size=BATCH_SIZE).run("doc", chunks)
+    else:
+        for store in stores:
+            store.store_document_chunks("doc", chunks)
+    return embedder
+
+
+def main():
+    print(f"{'file':<28}{'chunks':>8}{'calls before':>14}{'calls after':>13}{'texts before':>14}{'texts after':>13}")
+    for filename in sorted(os.listdir(DATA_DIR)):
+        document = load_text_file(os.path.join(DATA_DIR, filename))
+        if not document:
+            continue
+        chunks = [doc["content"] for doc in chunk_document(document, chunk_size=500, overlap=50)]
+        # Repeat the file to also show a document spanning several batches
+        for label, sample in ((filename, chunks), (f"{filename} x50", chunks * 50)):
+            before = run(sample, shared=False)
+            after = run(sample, shared=True)
+            print(f"{label:<28}{len(sample):>8}{before.calls:>14}{after.calls:>13}{before.texts:>14}{after.texts:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Search latency vs index size: script_score brute force vs native kNN (HNSW).
+
+Indexes synthetic random vectors into two throwaway indexes (one plain
+dense_vector, one with index: true / similarity: cosine), growing them step by
+step, and times the same queries against both. Requires a running Elasticsearch.
+
+Usage:
+    python scripts/benchmark_es_knn.py --sizes 1000 10000 50000 --dims 1536
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from elasticsearch import Elasticsearch, helpers
+
+BRUTE_INDEX = "knn_benchmark_script_score"
+HNSW_INDEX = "knn_benchmark_hnsw"
+
+
+def create_index(es, name, dims, hnsw):
+    vector_mapping = {"type": "dense_vector", "dims": dims}
+    if hnsw:
+        vector_mapping.update({"index": True, "similarity": "cosine"})
+    es.options(ignore_status=404).indices.delete(index=name)
+    es.indices.create(index=name, mappings={"properties": {"embedding": vector_mapping}})
+
+
+def add_vectors(es, vectors, start):
+    for name in (BRUTE_INDEX, HNSW_INDEX):
+        actions = (
+            {"_index": name, "_id": str(start + i), "_source": {"embedding": vector.tolist()}}
+            for i, vector in enumerate(vectors)
+        )
+        helpers.bulk(es, actions, chunk_size=500, request_timeout=300)
+        es.indices.refresh(index=name)
+        es.indices.forcemerge(index=name, max_num_segments=1, request_timeout=600)
+
+
+def time_queries(es, queries, k, hnsw):
+    latencies = []
+    for query in queries:
+        vector = query.tolist()
+        start = time.perf_counter()
+        if hnsw:
+            es.search(index=HNSW_INDEX, knn={"field": "embedding", "query_vector": vector, "k": k,
+                                             "num_candidates": max(100, k * 10)},
+                      size=k, source=False)
+        else:
+            es.search(index=BRUTE_INDEX, size=k, source=False, query={"script_score": {
+                "query": {"match_all": {}},
+                "script": {"source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
+                           "params": {"query_vector": vector}}
+            }})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), sorted(latencies)[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ES brute-force vs kNN search latency")
+    parser.add_argument("--host", default="http://localhost:9200")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    es = Elasticsearch(args.host)
+    rng = np.random.default_rng(42)
+    create_index(es, BRUTE_INDEX, args.dims, hnsw=False)
+    create_index(es, HNSW_INDEX, args.dims, hnsw=True)
+    queries = rng.standard_normal((args.queries, args.dims), dtype=np.float32)
+
+    print(f"{'docs':>10}{'script_score p50':>18}{'p95':>8}{'knn p50':>10}{'p95':>8}")
+    indexed = 0
+    for size in sorted(args.sizes):
+        add_vectors(es, rng.standard_normal((size - indexed, args.dims), dtype=np.float32), indexed)
+        indexed = size
+        brute_p50, brute_p95 = time_queries(es, queries, args.k, hnsw=False)
+        knn_p50, knn_p95 = time_queries(es, queries, args.k, hnsw=True)
+        print(f"{size:>10}{brute_p50:>16.1f}ms{brute_p95:>6.1f}ms{knn_p50:>8.1f}ms{knn_p95:>6.1f}ms")
+
+    for name in (BRUTE_INDEX, HNSW_INDEX):
+        es.indices.delete(index=name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Recall vs latency vs memory for the Qdrant storage modes.
+
+Builds one collection per storage mode (float32, scalar int8, binary, each
+optionally with vectors on disk) from the same synthetic clustered corpus,
+then runs the same queries at several hnsw_ef values. Recall@k is measured
+against exact (numpy) nearest neighbours; RAM is an estimate of vectors +
+HNSW links from StorageOptions.estimated_ram_bytes.
+Requires a Qdrant server (local mode ignores quantization and HNSW).
+
+Usage:
+    python scripts/benchmark_qdrant_storage.py --points 50000 --dims 1536 --ef 32 64 128
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, OptimizersConfigDiff, CollectionStatus
+from app.services.qdrant_storage import StorageOptions
+
+MODES = {
+    "float32": dict(),
+    "float32 on_disk": dict(on_disk=True),
+    "scalar": dict(quantization="scalar"),
+    "scalar on_disk": dict(quantization="scalar", on_disk=True),
+    "binary": dict(quantization="binary", oversampling=3.0),
+    "binary on_disk": dict(quantization="binary", oversampling=3.0, on_disk=True),
+}
+
+
+def synthetic_corpus(points, dims, queries, clusters, seed=0):
+    """Unit vectors drawn around random cluster centres (embeddings are clustered, not uniform)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dims)).astype(np.float32)
+    corpus = centres[rng.integers(0, clusters, points)] + 0.6 * rng.standard_normal((points, dims)).astype(np.float32)
+    query_set = centres[rng.integers(0, clusters, queries)] + 0.6 * rng.standard_normal((queries, dims)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    query_set /= np.linalg.norm(query_set, axis=1, keepdims=True)
+    return corpus, query_set
+
+
+def exact_neighbours(corpus, queries, k):
+    return [set(np.argsort(-(corpus @ query))[:k].tolist()) for query in queries]
+
+
+def build_collection(client, name, storage, corpus, batch_size):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        collection_name=name,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=1000),
+        **storage.collection_config(corpus.shape[1])
+    )
+    for start in range(0, len(corpus), batch_size):
+        client.upsert(
+            collection_name=name,
+            points=[PointStruct(id=start + i, vector=vector.tolist())
+                    for i, vector in enumerate(corpus[start:start + batch_size])],
+            wait=False
+        )
+    # Wait until the HNSW graph (and quantized vectors) are built
+    while client.get_collection(name).status != CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def run_queries(client, name, storage, queries, truth, k):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = client.query_points(
+            collection_name=name,
+            query=query.tolist(),
+            limit=k,
+            search_params=storage.search_params()
+        ).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & {hit.id for hit in hits}) / k)
+    latencies.sort()
+    return statistics.mean(recalls), statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant quantization / on-disk / HNSW settings")
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256], help="hnsw_ef values to test")
+    parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    parser.add_argument("--ef-construct", type=int, default=100)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections")
+    args = parser.parse_args()
+
+    client = QdrantClient(args.url, timeout=120)
+    try:
+        client.get_collections()
+    except Exception as e:
+        sys.exit(f"Qdrant is not reachable at {args.url}: {e}")
+
+    corpus, queries = synthetic_corpus(args.points, args.dims, args.queries, args.clusters)
+    truth = exact_neighbours(corpus, queries, args.k)
+    print(f"{args.points} points x {args.dims} dims, {args.queries} queries, recall@{args.k}, m={args.m}")
+    print(f"{'mode':<18}{'ef':>6}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}{'est. RAM MB':>13}{'build s':>9}")
+
+    for mode in args.modes:
+        name = f"benchmark_storage_{mode.replace(' ', '_')}"
+        storage = StorageOptions(hnsw_m=args.m, hnsw_ef_construct=args.ef_construct, **MODES[mode])
+        start = time.perf_counter()
+        build_collection(client, name, storage, corpus, args.batch_size)
+        build_s = time.perf_counter() - start
+        ram_mb = storage.estimated_ram_bytes(args.points, args.dims) / 1024 ** 2
+        for ef in args.ef:
+            storage.hnsw_ef = ef
+            recall, p50, p95 = run_queries(client, name, storage, queries, truth, args.k)
+            print(f"{mode:<18}{ef:>6}{recall:>9.3f}{p50:>9.2f}{p95:>9.2f}{ram_mb:>13.1f}{build_s:>9.1f}")
+        if not args.keep:
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Semantic cache lookup latency vs cache size.
+
+Compares the previous lookup (JSON dict of query -> embedding list, parsed
+on every request, cosine similarity in a Python loop) with the VectorIndex
+lookup the Redis backend runs (pre-normalized float32 matrix, one
+matrix-vector product + argmax). "bootstrap" is a fresh worker building its
+matrix row by row from the synced entries before its first lookup.
+Runs in-process on random 1536-dimension vectors; no Redis or OpenAI needed.
+
+Usage:
+    python scripts/benchmark_semantic_cache.py --sizes 100 1000 5000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.vector_index import VectorIndex
+
+
+def cosine_similarity(vec1, vec2):
+    vec1_np = np.array(vec1)
+    vec2_np = np.array(vec2)
+    norm1 = np.linalg.norm(vec1_np)
+    norm2 = np.linalg.norm(vec2_np)
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+    return float(np.dot(vec1_np, vec2_np) / (norm1 * norm2))
+
+
+def json_dict_lookup(serialized_index, query):
+    cache_index = json.loads(serialized_index)
+    best_match, best_similarity = None, 0.0
+    for cached_query, cached_embedding in cache_index.items():
+        similarity = cosine_similarity(query, cached_embedding)
+        if similarity > best_similarity:
+            best_match, best_similarity = cached_query, similarity
+    return best_match, best_similarity
+
+
+def time_ms(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic cache lookup latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000, 5000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'entries':>8}{'json dict':>14}{'matrix (bootstrap)':>21}{'matrix (warm)':>16}{'vectors KB':>12}{'json KB':>10}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dims)).astype(np.float32)
+        keys = [f"query {i}" for i in range(size)]
+        query = (vectors[size // 2] + rng.normal(0, 0.1, args.dims)).tolist()
+
+        serialized_json = json.dumps({key: vector.tolist() for key, vector in zip(keys, vectors)})
+
+        def bootstrap():
+            # What RedisMatrixBackend._sync does for a worker that has seen no entries yet
+            index = VectorIndex(dim=args.dims)
+            for key, vector in zip(keys, vectors):
+                index.add(key, vector)
+            return index
+
+        index = bootstrap()
+        assert json_dict_lookup(serialized_json, query)[0] == index.search(query)[0]
+        json_ms = time_ms(lambda: json_dict_lookup(serialized_json, query), args.repeats)
+        bootstrap_ms = time_ms(lambda: bootstrap().search(query), args.repeats)
+        warm_ms = time_ms(lambda: index.search(query), args.repeats)
+        print(f"{size:>8}{json_ms:>12.2f}ms{bootstrap_ms:>19.2f}ms{warm_ms:>14.3f}ms"
+              f"{vectors.nbytes / 1024:>12.0f}{len(serialized_json) / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Checks the search cache behaviour against an in-process fake Redis.
+
+Runs without Redis, Qdrant, Elasticsearch or OpenAI: the redis clients are
+replaced by fakeredis (with Lua support, for the semantic cache insert
+script) before the cache services are imported. Checked:
+
+- eviction: with "lru" the least recently hit entry goes first, with "lfu"
+  the least hit one, and re-caching a query keeps its hit count
+- corpus generation: a bump makes cached results miss, and a bump missed
+  during a Redis outage is applied once Redis is reachable again
+- search parameters: a similar query with another fusion or limit misses
+  both the exact and the semantic tier
+
+Requires ``pip install "fakeredis[lua]"``.
+
+Usage:
+    python -m scripts.check_cache_behaviour
+    python scripts/check_cache_behaviour.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401 (fakeredis needs it for EVAL)
+except ImportError:
+    sys.exit('This check needs fakeredis with Lua support: pip install "fakeredis[lua]"')
+
+import redis
+import redis.asyncio
+
+server = fakeredis.FakeServer()
+
+
+def _decode_responses(kwargs) -> bool:
+    pool = kwargs.get("connection_pool")
+    if pool is not None:
+        return pool.connection_kwargs.get("decode_responses", False)
+    return kwargs.get("decode_responses", False)
+
+
+class FakeRedis(fakeredis.FakeRedis):
+    def __init__(self, *args, **kwargs):
+        super().__init__(server=server, decode_responses=_decode_responses(kwargs))
+
+
+class FakeAsyncRedis(fakeredis.FakeAsyncRedis):
+    def __init__(self, *args, **kwargs):
+        super().__init__(server=server, decode_responses=_decode_responses(kwargs))
+
+
+# Every CacheService (including the shared one created on import) talks to the fake server
+redis.Redis = FakeRedis
+redis.asyncio.Redis = FakeAsyncRedis
+
+from app.services.cache_service import CacheService, CircuitBreaker  # noqa: E402
+from app.services.corpus_version import CorpusVersion  # noqa: E402
+from app.services.semantic_cache_backends import RedisMatrixBackend  # noqa: E402
+from app.services.semantic_cache_service import SemanticCacheService  # noqa: E402
+
+PARAMS = {"limit": 5, "fusion": "rrf", "rrf_k": 60, "weights": [0.5, 0.5], "filters": None}
+
+failures = []
+
+
+def check(name: str, ok: bool):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    if not ok:
+        failures.append(name)
+
+
+def vector(i: int):
+    """Orthogonal query vectors, so every query is only similar to itself."""
+    return [1.0 if j == i else 0.0 for j in range(8)]
+
+
+def semantic_cache(cache: CacheService, **backend_options) -> SemanticCacheService:
+    server.connected = True
+    cache.raw_redis.flushall()
+    return SemanticCacheService(0.9, backend=RedisMatrixBackend(cache, **backend_options),
+                                corpus_version=CorpusVersion(cache), exact_cache=cache)
+
+
+def cached(service: SemanticCacheService, i: int, params=PARAMS) -> bool:
+    return service.get(f"query {i}", query_embedding=vector(i), params=params) is not None
+
+
+def check_eviction(cache: CacheService):
+    service = semantic_cache(cache, max_entries=3, eviction_policy="lru")
+    for i in range(3):
+        service.set(f"query {i}", {"results": [i]}, query_embedding=vector(i), params=PARAMS)
+    cached(service, 0)
+    service.set("query 3", {"results": [3]}, query_embedding=vector(3), params=PARAMS)
+    check("lru evicts the least recently used entry", not cached(service, 1) and cached(service, 0))
+
+    service = semantic_cache(cache, max_entries=3, eviction_policy="lfu")
+    for i in range(3):
+        service.set(f"query {i}", {"results": [i]}, query_embedding=vector(i), params=PARAMS)
+    for _ in range(3):
+        cached(service, 0)
+    cached(service, 2)
+    service.set("query 3", {"results": [3]}, query_embedding=vector(3), params=PARAMS)
+    check("lfu evicts the least frequently used entry", not cached(service, 1) and cached(service, 0))
+
+    # Re-caching the hot query must not reset its hit count to zero
+    service.set("query 0", {"results": ["again"]}, query_embedding=vector(0), params=PARAMS)
+    service.set("query 4", {"results": [4]}, query_embedding=vector(4), params=PARAMS)
+    check("lfu re-insert keeps the hit count", cached(service, 0))
+    check("evictions are counted", service.stats()["semantic"]["evictions"] == 2)
+
+
+async def check_generation(cache: CacheService):
+    service = semantic_cache(cache)
+    version = service.corpus_version
+    await service.aset("query 0", {"results": [0]}, query_embedding=vector(0), params=PARAMS)
+    before = await service.aget("query 0", query_embedding=vector(0), params=PARAMS)
+    await version.abump()
+    after = await service.aget("query 0", query_embedding=vector(0), params=PARAMS)
+    check("a corpus change invalidates cached results", before is not None and after is None)
+
+    await service.aset("query 0", {"results": [0]}, query_embedding=vector(0), params=PARAMS)
+    generation = await version.acurrent()
+    server.connected = False
+    await version.abump()
+    server.connected = True
+    # Wait out the circuit breaker opened by the outage
+    while not cache.enabled:
+        await asyncio.sleep(0.01)
+    check("a bump missed during an outage is applied on recovery", await version.acurrent() == generation + 1)
+    check("results cached before the missed bump stay stale",
+          await service.aget("query 0", query_embedding=vector(0), params=PARAMS) is None)
+
+
+def check_params(cache: CacheService):
+    service = semantic_cache(cache)
+    other_fusion = {**PARAMS, "fusion": "minmax"}
+    other_limit = {**PARAMS, "limit": 10}
+    generation = service.corpus_version.current()
+
+    service.set("query 0", {"results": [0]}, query_embedding=vector(0), generation=generation,
+                exact_key=service.exact_key("query 0", PARAMS, generation), params=PARAMS)
+    check("same parameters hit the semantic tier", cached(service, 0))
+    check("another fusion misses the semantic tier", not cached(service, 0, other_fusion))
+    check("another limit misses the semantic tier", not cached(service, 0, other_limit))
+    check("another fusion misses the exact tier",
+          service.get_exact(service.exact_key("query 0", other_fusion, generation)) is None
+          and service.get_exact(service.exact_key("query 0", PARAMS, generation)) is not None)
+
+
+def main():
+    # Short breaker backoff so the outage check recovers quickly
+    cache = CacheService(retries=0, breaker=CircuitBreaker(reset_timeout=0.05))
+    check_eviction(cache)
+    asyncio.run(check_generation(cache))
+    check_params(cache)
+
+    print("OK" if not failures else f"FAILED: {len(failures)} checks")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
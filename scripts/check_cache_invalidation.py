@@ -0,0 +1,72 @@
+"""
+Checks that uploading a document invalidates cached search results.
+
+Caches a result for a query, runs a document through the IngestionPipeline
+(in-memory store and fake embedder, so no Qdrant, Elasticsearch or OpenAI
+needed), then repeats the identical query: it must miss the semantic cache.
+Requires Redis on localhost:6379 (uses the same CacheService as the API).
+
+Usage:
+    python scripts/check_cache_invalidation.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.cache_service import CacheService
+from app.services.corpus_version import CorpusVersion
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.semantic_cache_backends import RedisMatrixBackend
+from app.services.semantic_cache_service import SemanticCacheService
+
+QUERY = "how do solar panels work"
+QUERY_VECTOR = [1.0, 0.0, 0.0]
+
+
+class MemoryStore:
+    def __init__(self):
+        self.chunks = []
+
+    def store_document_chunks(self, document_id, chunks, title, embeddings=None, start_index=0):
+        self.chunks.extend(chunks)
+
+
+def fake_embed(texts, batch_size=100):
+    return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+
+async def fake_aembed(texts, batch_size=100):
+    return fake_embed(texts)
+
+
+async def main():
+    cache = CacheService()
+    if not cache.enabled:
+        sys.exit("Redis is not reachable on localhost:6379")
+
+    version = CorpusVersion(cache)
+    semantic_cache = SemanticCacheService(0.9, backend=RedisMatrixBackend(cache), corpus_version=version)
+    pipeline = IngestionPipeline([MemoryStore()], embed_fn=fake_embed, aembed_fn=fake_aembed,
+                                 corpus_version=version)
+
+    await semantic_cache.aset(QUERY, {"results": ["before upload"]}, query_embedding=QUERY_VECTOR)
+    before = await semantic_cache.aget(QUERY, query_embedding=QUERY_VECTOR)
+    print(f"Before upload (generation {await version.acurrent()}): {'hit' if before else 'miss'}")
+
+    await pipeline.arun("doc-1", ["Solar panels convert sunlight into electricity."], title="solar.txt")
+    after = await semantic_cache.aget(QUERY, query_embedding=QUERY_VECTOR)
+    print(f"After upload (generation {await version.acurrent()}): {'hit' if after else 'miss'}")
+
+    await semantic_cache.aset(QUERY, {"results": ["after upload"]}, query_embedding=QUERY_VECTOR)
+    refreshed = await semantic_cache.aget(QUERY, query_embedding=QUERY_VECTOR)
+    print(f"Re-cached after upload: {refreshed['results'] if refreshed else 'miss'}")
+
+    ok = before is not None and after is None and refreshed and refreshed["results"] == ["after upload"]
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
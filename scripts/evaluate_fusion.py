@@ -0,0 +1,114 @@
+"""
+Offline evaluation of hybrid fusion strategies: recall@k and nDCG@k.
+
+Scores each strategy in app/services/fusion.py (plus each leg alone) on a set
+of runs. A run is one query with its relevant keys and the ranked (key, score)
+lists returned by both legs. Without --runs, a synthetic set is generated where
+the dense and BM25 legs have different score scales and partially overlapping
+recall, which is the situation fusion has to handle.
+
+Runs file format (one JSON object per line):
+    {"relevant": ["doc1_0", "doc1_3"],
+     "qdrant": [["doc1_0", 0.82], ["doc2_1", 0.79]],
+     "elasticsearch": [["doc1_3", 12.4], ["doc1_0", 9.1]]}
+
+Usage:
+    python scripts/evaluate_fusion.py --k 5
+    python scripts/evaluate_fusion.py --runs runs.jsonl --k 10
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.fusion import FUSION_STRATEGIES, fuse
+
+
+def synthetic_runs(num_queries=200, corpus_size=2000, relevant_per_query=4, depth=20, seed=7):
+    """Dense leg: cosine-like scores in [0, 1]; lexical leg: BM25-like scores up to ~25."""
+    rng = np.random.default_rng(seed)
+    runs = []
+    for _ in range(num_queries):
+        relevant = rng.choice(corpus_size, relevant_per_query, replace=False)
+        is_relevant = np.zeros(corpus_size, dtype=bool)
+        is_relevant[relevant] = True
+        # Each leg finds most relevant chunks, but misses some the other leg finds
+        dense = np.where(is_relevant & (rng.random(corpus_size) < 0.75), 0.62, 0.45) + rng.normal(0, 0.045, corpus_size)
+        lexical = np.where(is_relevant & (rng.random(corpus_size) < 0.65), 15.0, 6.0) + rng.gamma(2.0, 1.2, corpus_size)
+        top_dense = np.argsort(-dense)[:depth]
+        top_lexical = np.argsort(-lexical)[:depth]
+        runs.append({
+            "relevant": [int(i) for i in relevant],
+            "qdrant": [[int(i), float(dense[i])] for i in top_dense],
+            "elasticsearch": [[int(i), float(lexical[i])] for i in top_lexical],
+        })
+    return runs
+
+
+def load_runs(path):
+    def key(value):
+        return tuple(value) if isinstance(value, list) else value
+
+    runs = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                run = json.loads(line)
+                runs.append({
+                    "relevant": [key(k) for k in run["relevant"]],
+                    "qdrant": [[key(k), s] for k, s in run["qdrant"]],
+                    "elasticsearch": [[key(k), s] for k, s in run["elasticsearch"]],
+                })
+    return runs
+
+
+def recall_at_k(ranked, relevant, k):
+    return len(set(ranked[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def ndcg_at_k(ranked, relevant, k):
+    gains = [1.0 / np.log2(i + 2) for i, key in enumerate(ranked[:k]) if key in relevant]
+    ideal = sum(1.0 / np.log2(i + 2) for i in range(min(len(relevant), k)))
+    return sum(gains) / ideal if ideal else 0.0
+
+
+def evaluate(runs, k, weights):
+    systems = {
+        "qdrant only": lambda run: [key for key, _ in run["qdrant"]],
+        "elasticsearch only": lambda run: [key for key, _ in run["elasticsearch"]],
+    }
+    for strategy in FUSION_STRATEGIES:
+        systems[strategy] = lambda run, strategy=strategy: fuse(
+            [[tuple(c) for c in run["qdrant"]], [tuple(c) for c in run["elasticsearch"]]],
+            weights=weights, strategy=strategy
+        )[0]
+
+    print(f"{'system':<20}{f'recall@{k}':>12}{f'nDCG@{k}':>10}")
+    for name, rank in systems.items():
+        recalls, ndcgs = [], []
+        for run in runs:
+            ranked = rank(run)
+            relevant = set(run["relevant"])
+            recalls.append(recall_at_k(ranked, relevant, k))
+            ndcgs.append(ndcg_at_k(ranked, relevant, k))
+        print(f"{name:<20}{np.mean(recalls):>12.3f}{np.mean(ndcgs):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", help="JSONL file of runs (default: synthetic)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--weights", type=float, nargs=2, default=[0.5, 0.5], metavar=("QDRANT", "ES"))
+    args = parser.parse_args()
+
+    runs = load_runs(args.runs) if args.runs else synthetic_runs()
+    print(f"Evaluating {len(runs)} queries")
+    evaluate(runs, args.k, args.weights)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Concurrent-request load test for the /documents search endpoints.
+
+Sends the same number of requests at increasing concurrency levels and
+reports throughput and latency percentiles. Run it against a server started
+from the commit before the async port and again after it to compare:
+
+    poetry run uvicorn app.main:app --workers 1
+    python scripts/load_test_search.py --endpoint search-hybrid --requests 200
+
+Use --unique to send distinct queries (cold path, no cache hits).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+QUERIES = [
+    "how does solar energy reduce emissions",
+    "machine learning model deployment",
+    "product warranty and return policy",
+    "step by step installation guide",
+    "recycling programs for electronics",
+]
+
+
+def send(session, url, token, query):
+    start = time.perf_counter()
+    response = session.post(url, json={"query": query, "limit": 5}, headers={"x-token": token}, timeout=120)
+    return time.perf_counter() - start, response.status_code
+
+
+def run_level(url, token, concurrency, total, unique):
+    queries = [
+        f"{QUERIES[i % len(QUERIES)]} {i}" if unique else QUERIES[i % len(QUERIES)]
+        for i in range(total)
+    ]
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda q: send(session, url, token, q), queries))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status != 200)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    print(f"{concurrency:>12}{total / elapsed:>12.1f}{statistics.median(latencies) * 1000:>10.0f}"
+          f"{p95 * 1000:>10.0f}{errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="search-hybrid",
+                        choices=["search-qdrant", "search-elasticsearch", "search-hybrid"])
+    parser.add_argument("--token", default=None, help="x-token header (defaults to settings.secret_key)")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--unique", action="store_true", help="Send distinct queries (no cache hits)")
+    args = parser.parse_args()
+
+    token = args.token
+    if token is None:
+        from app.config import settings
+        token = settings.secret_key
+
+    url = f"{args.url}/documents/{args.endpoint}"
+    print(f"Load testing {url} with {args.requests} requests per level")
+    print(f"{'concurrency':>12}{'req/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for concurrency in args.concurrency:
+        run_level(url, token, concurrency, args.requests, args.unique)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Migrate the Elasticsearch "documents" index to the current mapping version.
+
+Reindexes the existing index (a legacy concrete "documents" index or an older
+"documents_vN") into "documents_v<INDEX_VERSION>" and atomically points the
+"documents" alias at it. Safe to re-run: does nothing when already migrated.
+
+Usage:
+    python scripts/migrate_es_index.py [--keep-old]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.elasticsearch_service import ElasticsearchService
+
+parser = argparse.ArgumentParser(description="Migrate the documents index to the current mapping")
+parser.add_argument("--keep-old", action="store_true", help="Keep the previous versioned index after the swap")
+args = parser.parse_args()
+
+service = ElasticsearchService()
+print(f"Migrating '{service.index_name}' to '{service.physical_index}'...")
+result = service.migrate_index(delete_old=not args.keep_old)
+if result["migrated"]:
+    print(f"Reindexed {result['documents']} documents from '{result['source']}' into '{result['index']}'")
+else:
+    print(f"Already on '{result['index']}', nothing to do.")
@@ -0,0 +1,84 @@
+"""
+Multi-worker stress test for the Redis semantic cache backend.
+
+Starts several workers (processes by default, like uvicorn workers), each with
+its own RedisMatrixBackend, that insert distinct queries while also doing
+lookups. Afterwards a fresh backend must find every inserted query with its
+own result; any miss is an entry lost to a concurrent write.
+Requires Redis on localhost:6379 (uses the same CacheService as the API).
+
+Usage:
+    python scripts/stress_semantic_cache.py --workers 8 --inserts 200
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.cache_service import CacheService
+from app.services.semantic_cache_backends import RedisMatrixBackend
+
+DIMS = 256
+
+
+def vector_for(worker, i):
+    return np.random.default_rng(worker * 100000 + i).standard_normal(DIMS).astype(np.float32)
+
+
+def run_worker(worker, inserts):
+    backend = RedisMatrixBackend(CacheService())
+    for i in range(inserts):
+        backend.insert(f"stress {worker}-{i}", vector_for(worker, i), {"worker": worker, "i": i}, ttl=600)
+        backend.lookup(vector_for((worker + 1) % 7, i), threshold=0.99)
+    return len(backend.index)
+
+
+def clear(cache):
+    redis = cache.raw_redis
+    keys = list(redis.scan_iter(match=f"{RedisMatrixBackend.ENTRY_PREFIX}*"))
+    if keys:
+        redis.delete(*keys)
+    redis.delete(RedisMatrixBackend.LOG_KEY, RedisMatrixBackend.USAGE_KEY, RedisMatrixBackend.EXPIRY_KEY,
+                 RedisMatrixBackend.SIZES_KEY, RedisMatrixBackend.BYTES_KEY, RedisMatrixBackend.EVICTIONS_KEY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the semantic cache with concurrent writers")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--inserts", type=int, default=200, help="Inserts per worker")
+    parser.add_argument("--threads", action="store_true", help="Use threads instead of processes")
+    args = parser.parse_args()
+
+    cache = CacheService()
+    if not cache.enabled:
+        sys.exit("Redis is not reachable on localhost:6379")
+    clear(cache)
+
+    pool_class = ThreadPoolExecutor if args.threads else ProcessPoolExecutor
+    start = time.perf_counter()
+    with pool_class(max_workers=args.workers) as pool:
+        sizes = list(pool.map(run_worker, range(args.workers), [args.inserts] * args.workers))
+    elapsed = time.perf_counter() - start
+    total = args.workers * args.inserts
+    print(f"{total} inserts from {args.workers} workers in {elapsed:.2f}s ({total / elapsed:.0f} inserts/s)")
+    print(f"Entries visible to each worker at its end: min {min(sizes)}, max {max(sizes)}")
+
+    checker = RedisMatrixBackend(cache)
+    lost = 0
+    for worker in range(args.workers):
+        for i in range(args.inserts):
+            hit = checker.lookup(vector_for(worker, i), threshold=0.999)
+            if not hit or hit[0] != {"worker": worker, "i": i}:
+                lost += 1
+    print(f"Fresh worker sees {len(checker.index)} entries; lost entries: {lost}")
+    clear(cache)
+    sys.exit(1 if lost else 0)
+
+
+if __name__ == "__main__":
+    main()